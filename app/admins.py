@@ -0,0 +1,60 @@
+import logging
+import os
+import time
+from typing import Iterable, Optional, Set
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database.models import BotAdmin
+
+
+logger = logging.getLogger(__name__)
+
+
+# Как часто процесс перечитывает список админов из БД, сек.
+ADMINS_REFRESH_INTERVAL = float(os.getenv('ADMINS_REFRESH_INTERVAL', 30))
+
+
+class AdminRegistry:
+    """
+    Список админов бота в таблице bot_admins.
+    Таблица общая для всех процессов бота, а каждый процесс держит копию
+    списка в памяти и перечитывает ее не чаще раза в refresh_interval.
+    """
+
+    def __init__(self, refresh_interval: float = ADMINS_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.session_pool: Optional[async_sessionmaker] = None
+        self._ids: Set[int] = set()
+        self._loaded_at: Optional[float] = None
+
+    def start(self, session_pool: async_sessionmaker):
+        self.session_pool = session_pool
+        self._loaded_at = None
+
+    async def set(self, admin_ids: Iterable[int]):
+        """Заменить список админов (вызывается командой /admin в группе)"""
+        admin_ids = set(admin_ids)
+        async with self.session_pool() as session:
+            await session.execute(delete(BotAdmin))
+            if admin_ids:
+                await session.execute(insert(BotAdmin), [{"tg_id": tg_id} for tg_id in admin_ids])
+            await session.commit()
+        self._ids = admin_ids
+        self._loaded_at = time.monotonic()
+        logger.info(f"Список админов обновлен: {len(admin_ids)}")
+
+    async def is_admin(self, user_id: int) -> bool:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_interval:
+            await self._load()
+        return user_id in self._ids
+
+    async def _load(self):
+        async with self.session_pool() as session:
+            result = await session.scalars(select(BotAdmin.tg_id))
+            self._ids = set(result)
+        self._loaded_at = time.monotonic()
+
+
+admin_registry = AdminRegistry()
@@ -0,0 +1,797 @@
+import asyncio
+import logging
+import os
+import queue
+import time
+from contextlib import suppress
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.types import FSInputFile, InlineKeyboardMarkup, Message
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from sqlalchemy import select, update, delete, func, case
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.keyboards.inline import admin_main_menu
+from database.models import Broadcast, BroadcastDelivery, Course
+
+
+logger = logging.getLogger(__name__)
+
+
+# Лимиты Telegram: ~30 сообщений в секунду суммарно и не чаще 1 сообщения в секунду в один чат
+BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', 25))
+BROADCAST_WORKERS = int(os.getenv('BROADCAST_WORKERS', 8))
+PER_CHAT_INTERVAL = 1.0
+MAX_RETRIES = 3
+# Размер пачки получателей, которую диспетчер забирает из очереди
+BROADCAST_BATCH_SIZE = int(os.getenv('BROADCAST_BATCH_SIZE', 200))
+DISPATCHER_POLL_INTERVAL = 30
+# Сколько ждать завершения начатых отправок при остановке бота, сек.
+BROADCAST_STOP_TIMEOUT = float(os.getenv('BROADCAST_STOP_TIMEOUT', 30))
+# Минимальный интервал между обновлениями сообщения о прогрессе рассылки, сек.
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv('BROADCAST_PROGRESS_INTERVAL', 5))
+
+
+async def send_photo_with_caption(
+    recipient_id: int,
+    photo: Union[str, FSInputFile],
+    text: str,
+    bot: Bot,
+    reply_markup: Optional[InlineKeyboardMarkup] = None
+) -> Message:
+    """
+    Универсальная функция для отправки фото с подписью.
+    Возвращает сообщение с фото, из него можно взять file_id для повторной отправки.
+    """
+    try:
+        # Если photo - это путь к файлу
+        if isinstance(photo, str) and os.path.exists(photo):
+            photo = FSInputFile(photo)
+
+        if len(text) <= 1024:
+            return await bot.send_photo(
+                chat_id=recipient_id,
+                photo=photo,
+                caption=text,
+                parse_mode="HTML",
+                reply_markup=reply_markup
+            )
+
+        photo_msg = await bot.send_photo(
+            chat_id=recipient_id,
+            photo=photo,
+            parse_mode="HTML"
+        )
+        await bot.send_message(
+            chat_id=recipient_id,
+            text=text,
+            parse_mode="HTML",
+            disable_web_page_preview=True,
+            reply_markup=reply_markup
+        )
+        return photo_msg
+    except Exception as e:
+        logger.error(f"Ошибка при отправке фото: {e}", exc_info=True)
+        raise
+
+
+def get_file_id(message: Optional[Message]) -> Optional[str]:
+    """file_id самого большого размера фото из отправленного сообщения"""
+    if message and message.photo:
+        return message.photo[-1].file_id
+    return None
+
+
+class TokenBucket:
+    """Ограничитель частоты запросов (token bucket)"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Приостановить выдачу токенов (например, после TelegramRetryAfter)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+class Broadcaster:
+    """
+    Движок доставки рассылок: пул воркеров, общий лимит частоты,
+    лимит на один чат и повтор после TelegramRetryAfter.
+    """
+
+    def __init__(self,
+                 workers: int = BROADCAST_WORKERS,
+                 rate: float = BROADCAST_RATE,
+                 per_chat_interval: float = PER_CHAT_INTERVAL,
+                 max_retries: int = MAX_RETRIES):
+        self.workers = workers
+        self.limiter = TokenBucket(rate)
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self.success_count = 0
+        self.failed_count = 0
+        self.cancelled = False
+        self.stopped = False
+        self._last_sent: Dict[int, float] = {}
+
+    def cancel(self):
+        """Остановить рассылку: уже начатые отправки завершатся, остальные получатели пропускаются"""
+        self.cancelled = True
+
+    def stop(self):
+        """Прервать отправку при остановке бота: как cancel(), но рассылка продолжится после перезапуска"""
+        self.stopped = True
+
+    @property
+    def interrupted(self) -> bool:
+        return self.cancelled or self.stopped
+
+    async def _wait_chat(self, chat_id: int):
+        last = self._last_sent.get(chat_id)
+        if last is not None:
+            delay = last + self.per_chat_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        self._last_sent[chat_id] = time.monotonic()
+
+    async def _deliver(self, chat_id: int,
+                       send: Union[Callable[[int], Awaitable[Any]], Sequence[Callable[[int], Awaitable[Any]]]],
+                       cost: Optional[float] = None,
+                       before_send: Optional[Callable[[], Awaitable[Any]]] = None) -> bool:
+        # Сообщение из нескольких частей повторяется по частям: после
+        # TelegramRetryAfter на второй части первая не отправляется повторно
+        parts = tuple(send) if isinstance(send, (list, tuple)) else (send,)
+        part_cost = (cost if cost is not None else len(parts)) / len(parts)
+        for index, part in enumerate(parts):
+            for attempt in range(self.max_retries + 1):
+                await self.limiter.acquire(part_cost)
+                # Лимит на один чат действует и между частями одного сообщения
+                await self._wait_chat(chat_id)
+                if index == 0 and attempt == 0 and before_send is not None:
+                    await before_send()
+                try:
+                    await part(chat_id)
+                    break
+                except TelegramRetryAfter as e:
+                    logger.warning(f"Flood control, пауза {e.retry_after} с. (попытка {attempt + 1})")
+                    self.limiter.pause(e.retry_after)
+                except TelegramForbiddenError:
+                    # Пользователь заблокировал бота - повторять бессмысленно
+                    return False
+                except Exception as e:
+                    logger.error(f"Ошибка отправки для {chat_id}: {e}")
+                    return False
+            else:
+                return False
+        return True
+
+    async def run(self,
+                  recipients: Iterable[Tuple[int, ...]],
+                  send: Union[Callable[[int], Awaitable[Any]], Sequence[Callable[[int], Awaitable[Any]]]],
+                  course_stats: Optional[Dict[int, dict]] = None,
+                  cost: Optional[float] = None,
+                  on_result: Optional[Callable[[Tuple[int, ...], bool], Any]] = None,
+                  on_send: Optional[Callable[[Tuple[int, ...]], Awaitable[Any]]] = None) -> Tuple[int, int]:
+        """
+        Разослать сообщение получателям.
+        :param recipients: Кортежи (tg_id, course_id, ...)
+        :param send: Корутина отправки одному получателю или список корутин,
+                     отправляющих сообщение по частям (одна часть - один запрос к API)
+        :param course_stats: Статистика по курсам, счетчики success/failed обновляются на месте
+        :param cost: Число запросов к API на одного получателя (по умолчанию - число частей)
+        :param on_result: Вызывается для каждого получателя с результатом доставки
+                          (None, если отправка была прервана)
+        :param on_send: Вызывается перед первой попыткой отправки получателю
+        :return: (успешно, ошибки)
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                try:
+                    if item is None:
+                        return
+                    if self.interrupted:
+                        continue
+                    tg_id, course_id = item[0], item[1]
+                    before_send = (lambda: on_send(item)) if on_send is not None else None
+                    try:
+                        delivered = await self._deliver(tg_id, send, cost, before_send)
+                    except asyncio.CancelledError:
+                        # Отправка прервана: неизвестно, дошло ли сообщение
+                        if on_result is not None:
+                            on_result(item, None)
+                        raise
+                    if on_result is not None:
+                        on_result(item, delivered)
+                    key = "success" if delivered else "failed"
+                    if delivered:
+                        self.success_count += 1
+                    else:
+                        self.failed_count += 1
+                    if course_stats is not None and course_id in course_stats:
+                        course_stats[course_id][key] += 1
+                finally:
+                    queue.task_done()
+
+        tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+        try:
+            for recipient in recipients:
+                if self.interrupted:
+                    break
+                await queue.put(recipient)
+            for _ in tasks:
+                await queue.put(None)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Дождаться остановки воркеров: прерванные отправки должны сообщить
+            # результат до того, как вызывающий сохранит итоги пачки
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._last_sent.clear()
+
+        return self.success_count, self.failed_count
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600} ч {seconds % 3600 // 60} мин"
+    if seconds >= 60:
+        return f"{seconds // 60} мин {seconds % 60} с"
+    return f"{seconds} с"
+
+
+class BroadcastProgress:
+    """
+    Счетчики доставки рассылки в памяти.
+    Обновляются на каждого получателя, поэтому отчет о прогрессе не требует запросов к БД.
+    """
+
+    def __init__(self, total: int, sent: int = 0, failed: int = 0):
+        self.total = total
+        self.sent = sent
+        self.failed = failed
+        # Получатели, обработанные до перезапуска, не учитываются в скорости
+        self._done_at_start = sent + failed
+        self._started = time.monotonic()
+
+    def add(self, delivered: Optional[bool]):
+        if delivered:
+            self.sent += 1
+        else:
+            self.failed += 1
+
+    @property
+    def remaining(self) -> int:
+        return max(self.total - self.sent - self.failed, 0)
+
+    @property
+    def throughput(self) -> float:
+        """Получателей в секунду с момента запуска"""
+        elapsed = time.monotonic() - self._started
+        if elapsed <= 0:
+            return 0.0
+        return (self.sent + self.failed - self._done_at_start) / elapsed
+
+    def render(self, broadcast_id: int) -> str:
+        throughput = self.throughput
+        if throughput > 0:
+            eta = f"~{format_duration(self.remaining / throughput)}"
+        else:
+            eta = "оценивается..."
+
+        return "\n".join([
+            f"📤 <b>Рассылка #{broadcast_id}</b>",
+            "",
+            f"✅ Отправлено: {self.sent}",
+            f"❌ Ошибки: {self.failed}",
+            f"⏳ Осталось: {self.remaining} из {self.total}",
+            f"🚀 Скорость: {throughput:.1f} сообщ./с",
+            f"🕒 Ожидаемое время: {eta}",
+        ])
+
+
+class MessageSender:
+    """
+    Отправка содержимого рассылки одному получателю.
+    Фото загружается с диска один раз, дальше используется его file_id.
+    """
+
+    def __init__(self, bot: Bot, text: str,
+                 photo: Optional[str] = None,
+                 file_id: Optional[str] = None):
+        self.bot = bot
+        self.text = text
+        self.photo = photo
+        self.file_id = file_id
+        self._upload_lock = asyncio.Lock()
+
+    @property
+    def parts(self) -> List[Callable[[int], Awaitable[Any]]]:
+        """Части сообщения: каждая отправляется отдельным запросом и повторяется отдельно"""
+        if not self.photo:
+            return [self._send_text]
+        # Фото с длинным текстом отправляется двумя сообщениями
+        if len(self.text) > 1024:
+            return [self._send_photo, self._send_text]
+        return [self._send_photo]
+
+    async def __call__(self, tg_id: int):
+        for part in self.parts:
+            await part(tg_id)
+
+    async def _send_text(self, tg_id: int):
+        await self.bot.send_message(
+            chat_id=tg_id,
+            text=self.text,
+            disable_web_page_preview=True,
+            parse_mode="HTML"
+        )
+
+    async def _send_photo(self, tg_id: int):
+        # Длинный текст не помещается в подпись и уходит отдельной частью
+        caption = self.text if len(self.text) <= 1024 else None
+
+        if not self.file_id:
+            # Остальные получатели ждут, пока первая загрузка вернет file_id
+            async with self._upload_lock:
+                if not self.file_id:
+                    photo = self.photo
+                    if os.path.exists(photo):
+                        photo = FSInputFile(photo)
+                    photo_msg = await self.bot.send_photo(
+                        chat_id=tg_id,
+                        photo=photo,
+                        caption=caption,
+                        parse_mode="HTML"
+                    )
+                    self.file_id = get_file_id(photo_msg)
+                    return
+
+        await self.bot.send_photo(
+            chat_id=tg_id,
+            photo=self.file_id,
+            caption=caption,
+            parse_mode="HTML"
+        )
+
+
+class BroadcastDispatcher:
+    """
+    Фоновая доставка рассылок из таблицы broadcast_deliveries.
+    Получатели забираются пачками, статус каждого сохраняется в БД,
+    поэтому после перезапуска доставка продолжается с места остановки.
+    """
+
+    def __init__(self,
+                 batch_size: int = BROADCAST_BATCH_SIZE,
+                 poll_interval: float = DISPATCHER_POLL_INTERVAL,
+                 progress_interval: float = BROADCAST_PROGRESS_INTERVAL,
+                 rate: float = BROADCAST_RATE):
+        self.batch_size = batch_size
+        self.rate = rate
+        self.poll_interval = poll_interval
+        self.progress_interval = progress_interval
+        self.bot: Optional[Bot] = None
+        self.session_pool: Optional[async_sessionmaker] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # Рассылка, которая отправляется прямо сейчас
+        self._current: Optional[Tuple[int, Broadcaster]] = None
+        # Очередь команд между процессами (режим нескольких воркеров)
+        self._control = None
+        self._is_host = True
+        self._listener: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._saving: Optional[asyncio.Future] = None
+
+    def connect(self, control_queue, host: bool):
+        """
+        Режим нескольких процессов: рассылки отправляет только процесс host,
+        остальные передают ему команды wake/cancel через control_queue.
+        """
+        self._control = control_queue
+        self._is_host = host
+
+    def start(self, bot: Bot, session_pool: async_sessionmaker):
+        if not self._is_host:
+            return
+        self.bot = bot
+        self.session_pool = session_pool
+        self._stopping = False
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if self._control is not None and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self, timeout: float = BROADCAST_STOP_TIMEOUT):
+        """
+        Остановить доставку: начатые отправки завершаются и сохраняются,
+        остальные получатели остаются в очереди до следующего запуска.
+        """
+        self._stopping = True
+        if self._current is not None:
+            self._current[1].stop()
+        self._wakeup.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Рассылка не остановилась вовремя, прерываем отправку")
+                self._task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await self._task
+        if self._saving is not None and not self._saving.done():
+            # Иначе _recover при следующем запуске застанет пачку в статусе sending
+            with suppress(Exception):
+                await self._saving
+        if self._listener is not None:
+            self._listener.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._listener
+        self._task = self._listener = None
+
+    def wake(self):
+        """Сообщить о новой рассылке в очереди"""
+        if not self._is_host:
+            self._control.put(("wake", None))
+            return
+        self._wakeup.set()
+
+    def cancel(self, broadcast_id: int) -> bool:
+        """Отменить отправляемую рассылку, оставшимся получателям она не уйдет"""
+        if not self._is_host:
+            # Результат знает только процесс, который отправляет рассылку
+            self._control.put(("cancel", broadcast_id))
+            return True
+        if self._current is None or self._current[0] != broadcast_id:
+            return False
+        self._current[1].cancel()
+        return True
+
+    async def _listen(self):
+        while True:
+            try:
+                # Короткий таймаут, чтобы поток не блокировал остановку процесса
+                command, broadcast_id = await asyncio.to_thread(self._control.get, timeout=1)
+            except queue.Empty:
+                continue
+            if command == "wake":
+                self.wake()
+            elif command == "cancel":
+                self.cancel(broadcast_id)
+
+    async def _run(self):
+        await self._recover()
+        while not self._stopping:
+            try:
+                await self._drain()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка в диспетчере рассылок: {e}", exc_info=True)
+
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            self._wakeup.clear()
+
+    async def _recover(self):
+        # Статус sending ставится получателю перед передачей сообщения в Telegram.
+        # Если бот упал после этого, неизвестно, дошло ли сообщение, - повторно
+        # его не отправляем, чтобы не было дублей
+        async with self.session_pool() as session:
+            await session.execute(
+                update(BroadcastDelivery)
+                .where(BroadcastDelivery.status == BroadcastDelivery.STATUS_SENDING)
+                .values(status=BroadcastDelivery.STATUS_FAILED)
+            )
+            await session.commit()
+
+    async def _drain(self):
+        async with self.session_pool() as session:
+            broadcast_ids = (await session.scalars(
+                select(Broadcast.id)
+                .where(Broadcast.is_sent == False,
+                       Broadcast.deliveries.any(),
+                       # Отмененная админом рассылка не возобновляется
+                       ~Broadcast.deliveries.any(BroadcastDelivery.status == BroadcastDelivery.STATUS_CANCELLED))
+                .order_by(Broadcast.id)
+            )).all()
+
+        for broadcast_id in broadcast_ids:
+            if self._stopping:
+                break
+            await self._process(broadcast_id)
+
+    async def _process(self, broadcast_id: int):
+        async with self.session_pool() as session:
+            broadcast = await session.get(Broadcast, broadcast_id)
+            if broadcast is None:
+                # Рассылку удалили, пока ее получатели ждали в очереди
+                await session.execute(
+                    delete(BroadcastDelivery).where(BroadcastDelivery.broadcast_id == broadcast_id)
+                )
+                await session.commit()
+                logger.warning(f"Рассылка {broadcast_id} удалена, ее очередь доставки очищена")
+                return
+
+        sender = MessageSender(self.bot, broadcast.text,
+                               photo=broadcast.image_path,
+                               file_id=broadcast.image_file_id)
+        broadcaster = Broadcaster(rate=self.rate)
+        progress = await self._load_progress(broadcast_id)
+        progress_message_id = await self._send_progress(broadcast, progress)
+        reporter = None
+        if progress_message_id is not None:
+            reporter = asyncio.create_task(
+                self._report_progress(broadcast, progress, progress_message_id)
+            )
+
+        self._current = (broadcast_id, broadcaster)
+        if self._stopping:
+            broadcaster.stop()
+        try:
+            await self._deliver_batches(broadcast_id, sender, broadcaster, progress)
+        finally:
+            self._current = None
+            if reporter is not None:
+                reporter.cancel()
+                with suppress(asyncio.CancelledError):
+                    await reporter
+
+        if broadcaster.stopped and not broadcaster.cancelled:
+            # Бот останавливается: оставшиеся получатели ждут следующего запуска
+            if progress_message_id is not None:
+                await self._edit_progress(
+                    broadcast, progress_message_id,
+                    progress.render(broadcast.id) + "\n\n<b>⏸ Рассылка продолжится после перезапуска бота</b>"
+                )
+            return
+
+        if broadcaster.cancelled:
+            await self._cancel_pending(broadcast_id)
+
+        if progress_message_id is not None:
+            title = "⛔ Рассылка отменена" if broadcaster.cancelled else "✅ Рассылка завершена"
+            await self._edit_progress(
+                broadcast, progress_message_id,
+                progress.render(broadcast.id) + f"\n\n<b>{title}</b>"
+            )
+
+        await self._finish(broadcast, sender.file_id, sent=not broadcaster.cancelled)
+
+    async def _deliver_batches(self, broadcast_id: int, sender: MessageSender,
+                               broadcaster: Broadcaster, progress: BroadcastProgress):
+        while not broadcaster.interrupted:
+            async with self.session_pool() as session:
+                batch = (await session.execute(
+                    select(BroadcastDelivery.tg_id,
+                           BroadcastDelivery.course_id,
+                           BroadcastDelivery.id)
+                    .where(BroadcastDelivery.broadcast_id == broadcast_id,
+                           BroadcastDelivery.status == BroadcastDelivery.STATUS_PENDING)
+                    .order_by(BroadcastDelivery.id)
+                    .limit(self.batch_size)
+                )).all()
+            if not batch:
+                break
+
+            results = {}
+            # Получатели, чья отправка была прервана до обращения к Telegram
+            unsent = []
+            started = set()
+
+            first_part, *other_parts = sender.parts
+
+            async def send_first(tg_id: int):
+                started.add(tg_id)
+                await first_part(tg_id)
+
+            def on_result(item, delivered):
+                if delivered is None and item[0] not in started:
+                    unsent.append(item[2])
+                    return
+                results[item[2]] = delivered
+                progress.add(delivered)
+
+            try:
+                await broadcaster.run(batch, send=[send_first, *other_parts],
+                                      on_result=on_result, on_send=self._mark_sending)
+            finally:
+                # Сохранение не прерывается остановкой бота, иначе отправленные
+                # получатели остались бы в статусе sending; stop() его дожидается
+                self._saving = asyncio.ensure_future(self._save_results(results, unsent))
+                await asyncio.shield(self._saving)
+
+    async def _mark_sending(self, item: Tuple[int, ...]):
+        """Получатель передается в Telegram: после сбоя его не отправляем повторно"""
+        async with self.session_pool() as session:
+            await session.execute(
+                update(BroadcastDelivery)
+                .where(BroadcastDelivery.id == item[2])
+                .values(status=BroadcastDelivery.STATUS_SENDING)
+            )
+            await session.commit()
+
+    async def _load_progress(self, broadcast_id: int) -> BroadcastProgress:
+        # Единственный подсчет по БД: после перезапуска часть получателей уже обработана
+        async with self.session_pool() as session:
+            counts = dict((await session.execute(
+                select(BroadcastDelivery.status, func.count(BroadcastDelivery.id))
+                .where(BroadcastDelivery.broadcast_id == broadcast_id)
+                .group_by(BroadcastDelivery.status)
+            )).all())
+
+        return BroadcastProgress(
+            total=sum(counts.values()),
+            sent=counts.get(BroadcastDelivery.STATUS_SENT, 0),
+            failed=sum(count for status, count in counts.items()
+                       if status in (BroadcastDelivery.STATUS_FAILED,
+                                     BroadcastDelivery.STATUS_CANCELLED))
+        )
+
+    @staticmethod
+    def _cancel_keyboard(broadcast_id: int) -> InlineKeyboardMarkup:
+        builder = InlineKeyboardBuilder()
+        builder.button(text="⛔ Остановить рассылку", callback_data=f"stop_broadcast:{broadcast_id}")
+        return builder.as_markup()
+
+    async def _send_progress(self, broadcast: Broadcast,
+                             progress: BroadcastProgress) -> Optional[int]:
+        if not broadcast.admin_chat_id:
+            return None
+        try:
+            message = await self.bot.send_message(
+                chat_id=broadcast.admin_chat_id,
+                text=progress.render(broadcast.id),
+                parse_mode="HTML",
+                reply_markup=self._cancel_keyboard(broadcast.id)
+            )
+            return message.message_id
+        except Exception as e:
+            logger.warning(f"Не удалось отправить прогресс рассылки {broadcast.id}: {e}")
+            return None
+
+    async def _edit_progress(self, broadcast: Broadcast, message_id: int, text: str,
+                             reply_markup: Optional[InlineKeyboardMarkup] = None):
+        try:
+            await self.bot.edit_message_text(
+                chat_id=broadcast.admin_chat_id,
+                message_id=message_id,
+                text=text,
+                parse_mode="HTML",
+                reply_markup=reply_markup
+            )
+        except TelegramBadRequest:
+            pass  # Игнорируем, если сообщение не изменилось
+        except Exception as e:
+            logger.warning(f"Не удалось обновить прогресс рассылки {broadcast.id}: {e}")
+
+    async def _report_progress(self, broadcast: Broadcast,
+                               progress: BroadcastProgress, message_id: int):
+        # Редактирование идет отдельной задачей и не задерживает воркеров доставки
+        keyboard = self._cancel_keyboard(broadcast.id)
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            await self._edit_progress(broadcast, message_id, progress.render(broadcast.id), keyboard)
+
+    async def _cancel_pending(self, broadcast_id: int):
+        async with self.session_pool() as session:
+            await session.execute(
+                update(BroadcastDelivery)
+                .where(BroadcastDelivery.broadcast_id == broadcast_id,
+                       BroadcastDelivery.status == BroadcastDelivery.STATUS_PENDING)
+                .values(status=BroadcastDelivery.STATUS_CANCELLED)
+            )
+            await session.commit()
+
+    async def _save_results(self, results: Dict[int, Optional[bool]], unsent: Iterable[int] = ()):
+        sent_ids = [i for i, delivered in results.items() if delivered]
+        # Прерванные отправки считаем ошибкой, чтобы не отправить сообщение дважды
+        failed_ids = [i for i, delivered in results.items() if not delivered]
+
+        async with self.session_pool() as session:
+            for ids, status in ((sent_ids, BroadcastDelivery.STATUS_SENT),
+                                (failed_ids, BroadcastDelivery.STATUS_FAILED),
+                                (list(unsent), BroadcastDelivery.STATUS_PENDING)):
+                if ids:
+                    # Получатели, прерванные до передачи в Telegram, остаются pending
+                    await session.execute(
+                        update(BroadcastDelivery)
+                        .where(BroadcastDelivery.id.in_(ids),
+                               BroadcastDelivery.status == BroadcastDelivery.STATUS_SENDING)
+                        .values(status=status)
+                    )
+            await session.commit()
+
+    async def _finish(self, broadcast: Broadcast, file_id: Optional[str], sent: bool = True):
+        async with self.session_pool() as session:
+            # Отмененная рассылка не считается отправленной и не показывается пользователям
+            await session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast.id)
+                .values(is_sent=sent, image_file_id=file_id)
+            )
+            await session.commit()
+
+            sent = func.sum(case((BroadcastDelivery.status == BroadcastDelivery.STATUS_SENT, 1), else_=0))
+            cancelled = func.sum(case((BroadcastDelivery.status == BroadcastDelivery.STATUS_CANCELLED, 1), else_=0))
+            stats = (await session.execute(
+                select(
+                    Course.name,
+                    func.count(BroadcastDelivery.id),
+                    sent,
+                    cancelled
+                )
+                .outerjoin(Course, Course.id == BroadcastDelivery.course_id)
+                .where(BroadcastDelivery.broadcast_id == broadcast.id)
+                .group_by(BroadcastDelivery.course_id, Course.name)
+            )).all()
+
+        if not broadcast.admin_chat_id:
+            return
+
+        total_users = sum(total for _, total, _, _ in stats)
+        success_count = sum(success or 0 for _, _, success, _ in stats)
+        cancelled_count = sum(skipped or 0 for _, _, _, skipped in stats)
+
+        # Отправка отчета
+        report_lines = [
+            "📊 <b>Отчет о рассылке:</b>",
+            f"👥 Всего получателей: {total_users}",
+            f"✅ Успешно: {success_count}",
+            f"❌ Ошибки: {total_users - success_count - cancelled_count}",
+        ]
+        if cancelled_count:
+            report_lines.append(f"⛔ Не отправлено (рассылка отменена): {cancelled_count}")
+        report_lines += ["", "<b>Статистика по курсам:</b>"]
+
+        for name, total, success, skipped in stats:
+            success = success or 0
+            skipped = skipped or 0
+            report_lines.append(
+                f"• {name or 'Курс удален'}: {success}/{total} "
+                f"(ошибок: {total - success - skipped})"
+            )
+
+        try:
+            await self.bot.send_message(
+                chat_id=broadcast.admin_chat_id,
+                text="\n".join(report_lines),
+                parse_mode="HTML",
+                reply_markup=await admin_main_menu()
+            )
+        except Exception as e:
+            logger.error(f"Не удалось отправить отчет о рассылке {broadcast.id}: {e}")
+
+
+broadcast_dispatcher = BroadcastDispatcher()
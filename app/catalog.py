@@ -0,0 +1,265 @@
+import functools
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Broadcast, Course, Project, Specialization
+from middlewares.db import LazySession
+
+
+logger = logging.getLogger(__name__)
+
+
+# Сколько готовых клавиатур хранится в памяти
+KEYBOARD_CACHE_SIZE = int(os.getenv('KEYBOARD_CACHE_SIZE', 512))
+# Сколько рассылок хранится в памяти для постраничного просмотра
+BROADCAST_CACHE_SIZE = int(os.getenv('BROADCAST_CACHE_SIZE', 256))
+
+# Аргументы-сессии не входят в ключ кэша клавиатур
+SESSION_TYPES = (AsyncSession, LazySession)
+
+
+class SpecializationItem(NamedTuple):
+    id: int
+    name: str
+
+
+class CourseItem(NamedTuple):
+    id: int
+    name: str
+    specialization_id: int
+
+
+class ProjectItem(NamedTuple):
+    id: int
+    title: str
+
+
+class BroadcastItem(NamedTuple):
+    id: int
+    text: str
+    image_path: Optional[str]
+    image_file_id: Optional[str]
+
+
+class CatalogCache:
+    """
+    Кэш справочников (специализации, курсы, проекты) в памяти процесса.
+    Данные читаются из БД при первом обращении и хранятся до invalidate(),
+    который вызывают админские обработчики после изменения справочников
+    (при нескольких воркерах - в любом из процессов, см. connect()).
+    Хранятся простые кортежи, а не ORM-объекты, чтобы не зависеть от сессии.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._data: Dict[str, Any] = {}
+        # Номер версии справочников, увеличивается при каждой инвалидации
+        self._version = 0
+        # Общий для процессов-воркеров счетчик версии (multiprocessing.Value)
+        self._shared_version = None
+        # Версия, к которой относятся данные в _data
+        self._data_version = 0
+
+    @property
+    def version(self) -> int:
+        if self._shared_version is not None:
+            return self._shared_version.value
+        return self._version
+
+    def connect(self, shared_version):
+        """
+        Режим нескольких процессов: версия справочников хранится в общей памяти,
+        поэтому invalidate() в одном воркере сбрасывает кэш во всех.
+        """
+        self._shared_version = shared_version
+        self._data.clear()
+        self._data_version = self.version
+
+    def invalidate(self):
+        self._data.clear()
+        if self._shared_version is not None:
+            with self._shared_version.get_lock():
+                self._shared_version.value += 1
+        else:
+            self._version += 1
+        self._data_version = self.version
+        logger.info(f"Кэш справочников сброшен, версия {self.version}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    async def _get(self, key: str, session: AsyncSession,
+                   loader: Callable[[AsyncSession], Awaitable[Any]]) -> Any:
+        version = self.version
+        if version != self._data_version:
+            # Справочники изменили в другом процессе
+            self._data.clear()
+            self._data_version = version
+
+        if key in self._data:
+            self.hits += 1
+            return self._data[key]
+
+        self.misses += 1
+        value = await loader(session)
+        # Если справочник изменили во время загрузки, результат мог устареть - не сохраняем
+        if version == self.version:
+            self._data[key] = value
+        return value
+
+    async def specializations(self, session: AsyncSession) -> List[SpecializationItem]:
+        return await self._get("specializations", session, self._load_specializations)
+
+    async def courses(self, session: AsyncSession,
+                      specialization_id: Optional[int] = None) -> List[CourseItem]:
+        courses = await self._get("courses", session, self._load_courses)
+        if specialization_id is None:
+            return courses
+        return [course for course in courses if course.specialization_id == specialization_id]
+
+    async def projects(self, session: AsyncSession) -> List[ProjectItem]:
+        return await self._get("projects", session, self._load_projects)
+
+    async def project(self, session: AsyncSession, project_id: int) -> Optional[ProjectItem]:
+        for project in await self.projects(session):
+            if project.id == project_id:
+                return project
+        return None
+
+    @staticmethod
+    async def _load_specializations(session: AsyncSession) -> List[SpecializationItem]:
+        result = await session.execute(
+            select(Specialization.id, Specialization.name).order_by(Specialization.id)
+        )
+        return [SpecializationItem(*row) for row in result]
+
+    @staticmethod
+    async def _load_courses(session: AsyncSession) -> List[CourseItem]:
+        result = await session.execute(
+            select(Course.id, Course.name, Course.specialization_id).order_by(Course.name, Course.id)
+        )
+        return [CourseItem(*row) for row in result]
+
+    @staticmethod
+    async def _load_projects(session: AsyncSession) -> List[ProjectItem]:
+        result = await session.execute(
+            select(Project.id, Project.title).order_by(Project.id)
+        )
+        return [ProjectItem(*row) for row in result]
+
+
+catalog_cache = CatalogCache()
+
+
+class KeyboardCache:
+    """
+    LRU-кэш готовых InlineKeyboardMarkup.
+    Ключ - функция, версия справочников и аргументы (кроме сессии),
+    поэтому после изменения справочников клавиатуры строятся заново.
+    """
+
+    def __init__(self, maxsize: int = KEYBOARD_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict = OrderedDict()
+        self._version = catalog_cache.version
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def memoize(self, func: Callable[..., Awaitable[Any]]):
+        """Декоратор для построителей клавиатур. Аргументы, кроме сессии, должны быть хешируемыми"""
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            version = catalog_cache.version
+            if self._version != version:
+                # Клавиатуры старой версии больше не понадобятся
+                self._items.clear()
+                self._version = version
+
+            key = (
+                func.__qualname__,
+                version,
+                tuple(arg for arg in args if not isinstance(arg, SESSION_TYPES)),
+                tuple(sorted((name, value) for name, value in kwargs.items()
+                             if not isinstance(value, SESSION_TYPES)))
+            )
+            if key in self._items:
+                self.hits += 1
+                self._items.move_to_end(key)
+                return self._items[key]
+
+            self.misses += 1
+            markup = await func(*args, **kwargs)
+            self._items[key] = markup
+            if len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+            return markup
+
+        return wrapper
+
+
+keyboard_cache = KeyboardCache()
+
+
+class BroadcastCache:
+    """
+    LRU-кэш содержимого рассылок для постраничного просмотра.
+    Пользователи листают одни и те же рассылки, поэтому каждая читается из БД один раз.
+    """
+
+    def __init__(self, maxsize: int = BROADCAST_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict = OrderedDict()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    async def get(self, session: AsyncSession, broadcast_id: int) -> Optional[BroadcastItem]:
+        if broadcast_id in self._items:
+            self.hits += 1
+            self._items.move_to_end(broadcast_id)
+            return self._items[broadcast_id]
+
+        self.misses += 1
+        row = (await session.execute(
+            select(Broadcast.id, Broadcast.text, Broadcast.image_path, Broadcast.image_file_id)
+            .where(Broadcast.id == broadcast_id)
+        )).first()
+        if row is None:
+            return None
+
+        item = BroadcastItem(*row)
+        self._items[broadcast_id] = item
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+        return item
+
+    def forget(self, broadcast_id: int):
+        """Убрать рассылку из кэша после ее изменения"""
+        self._items.pop(broadcast_id, None)
+
+
+broadcast_cache = BroadcastCache()
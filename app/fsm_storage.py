@@ -0,0 +1,134 @@
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy import case, delete, null, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database.models import FSMRecord
+
+
+logger = logging.getLogger(__name__)
+
+
+# Хранилище состояний FSM: memory, sql или redis
+FSM_STORAGE = os.getenv('FSM_STORAGE', 'memory')
+# Через сколько секунд без изменений состояние пользователя считается брошенным
+FSM_STATE_TTL = int(os.getenv('FSM_STATE_TTL', 24 * 60 * 60))
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+# Как часто удалять просроченные записи из таблицы, сек.
+SQL_STORAGE_CLEANUP_INTERVAL = 10 * 60
+
+
+class SQLStorage(BaseStorage):
+    """
+    Хранилище FSM в таблице fsm_states через общий движок БД.
+    Состояние и данные пользователя хранятся одной строкой, данные - компактным JSON.
+    Каждая запись продлевает срок жизни на ttl, просроченные записи удаляются.
+    """
+
+    def __init__(self,
+                 session_pool: async_sessionmaker,
+                 ttl: int = FSM_STATE_TTL,
+                 key_builder: Optional[KeyBuilder] = None,
+                 cleanup_interval: float = SQL_STORAGE_CLEANUP_INTERVAL):
+        self.session_pool = session_pool
+        self.ttl = ttl
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+        self.cleanup_interval = cleanup_interval
+        self._last_cleanup = time.monotonic()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._upsert(key, state=state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = await self._get(key)
+        return record.state if record else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._upsert(key, data=json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = await self._get(key)
+        if record is None or not record.data:
+            return {}
+        return json.loads(record.data)
+
+    async def close(self) -> None:
+        pass
+
+    async def _get(self, key: StorageKey):
+        async with self.session_pool() as session:
+            return (await session.execute(
+                select(FSMRecord.state, FSMRecord.data)
+                .where(FSMRecord.key == self.key_builder.build(key),
+                       FSMRecord.expires_at > datetime.now())
+            )).first()
+
+    async def _upsert(self, key: StorageKey, **values):
+        now = datetime.now()
+        values["expires_at"] = now + timedelta(seconds=self.ttl)
+
+        # Просроченная, но еще не удаленная запись не должна ожить с продленным сроком:
+        # незаданные поля в ней сбрасываются, как будто записи не было
+        expired = FSMRecord.expires_at <= now
+        updates = dict(values)
+        for column in (FSMRecord.state, FSMRecord.data):
+            if column.key not in updates:
+                updates[column.key] = case((expired, null()), else_=column)
+
+        async with self.session_pool() as session:
+            dialect = session.get_bind().dialect.name
+            insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            stmt = insert(FSMRecord).values(key=self.key_builder.build(key), **values)
+            await session.execute(
+                stmt.on_conflict_do_update(index_elements=[FSMRecord.key], set_=updates)
+            )
+            await session.commit()
+
+        if time.monotonic() - self._last_cleanup > self.cleanup_interval:
+            await self.cleanup()
+
+    async def cleanup(self) -> int:
+        """Удалить просроченные и пустые записи"""
+        self._last_cleanup = time.monotonic()
+        async with self.session_pool() as session:
+            result = await session.execute(
+                delete(FSMRecord).where(or_(
+                    FSMRecord.expires_at <= datetime.now(),
+                    # После state.clear() остается строка без состояния и данных
+                    FSMRecord.state.is_(None) & or_(FSMRecord.data.is_(None), FSMRecord.data == '{}')
+                ))
+            )
+            await session.commit()
+        return result.rowcount
+
+
+def create_storage(session_pool: async_sessionmaker) -> BaseStorage:
+    """Хранилище FSM по настройке FSM_STORAGE"""
+    if FSM_STORAGE == 'sql':
+        logger.info("FSM: хранилище в БД")
+        return SQLStorage(session_pool)
+
+    if FSM_STORAGE == 'redis':
+        # redis нужен только для этого режима
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        logger.info(f"FSM: хранилище Redis {REDIS_URL}")
+        return RedisStorage.from_url(
+            REDIS_URL,
+            key_builder=DefaultKeyBuilder(with_destiny=True),
+            state_ttl=FSM_STATE_TTL,
+            data_ttl=FSM_STATE_TTL
+        )
+
+    if FSM_STORAGE != 'memory':
+        logger.warning(f"Неизвестное хранилище FSM '{FSM_STORAGE}', используется память")
+    return MemoryStorage()
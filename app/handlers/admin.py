@@ -13,12 +13,14 @@ from sqlalchemy import select, func
 from datetime import datetime, timedelta
 from collections import defaultdict
 
+from app.jobs import job_runner
+from app.profiler import profiler
 from app.keyboards.inline import admin_main_menu
 from app.keyboards.reply import kb_admin_main, kb_main
 from database.models import User, Specialization, Course, Broadcast
 import re
 
-admin_router = Router()
+admin_router = Router(name="admin_router")
 admin_router.message.filter(ChatTypeFilter(["private"]), IsAdmin())
 
 
@@ -46,6 +48,60 @@ async def exit_admin_panel(message: Message,
     await state.clear()
 
 
+# Отмена фоновой задачи (выгрузки, отчеты)
+@admin_router.callback_query(F.data.startswith("cancel_job:"))
+async def cancel_job(callback: CallbackQuery):
+    job_id = int(callback.data.split(":")[-1])
+
+    if job_runner.cancel(job_id):
+        await callback.answer("Задача отменяется...")
+    else:
+        await callback.answer("Задача уже завершена", show_alert=True)
+
+
+
+
+# Профилирование апдейтов: /profile [on <доля> | off | dump]
+@admin_router.message(Command("profile"))
+async def profile_command(message: Message):
+    args = (message.text or "").split()[1:]
+
+    if args and args[0] == "on":
+        try:
+            sample_rate = float(args[1]) if len(args) > 1 else 0.1
+        except ValueError:
+            await message.answer("Доля апдейтов должна быть числом, например /profile on 0.1")
+            return
+        if not 0 < sample_rate <= 1:
+            await message.answer("Доля апдейтов должна быть от 0 до 1")
+            return
+        profiler.enable(sample_rate)
+        await message.answer(f"🔬 Профилирование включено, доля апдейтов: {sample_rate}")
+        return
+
+    if args and args[0] == "off":
+        profiler.disable()
+        await message.answer("Профилирование выключено")
+        return
+
+    if args and args[0] == "dump":
+        path = profiler.dump()
+        if path is None:
+            await message.answer("Снимков пока нет")
+            return
+        await message.answer_document(
+            FSInputFile(path),
+            caption="Collapsed stacks для flamegraph.pl или speedscope"
+        )
+        return
+
+    top = "\n".join(f"{handler}: {count}" for handler, count in profiler.top_handlers()) or "нет данных"
+    await message.answer(
+        f"🔬 Профилирование: {'включено' if profiler.sample_rate > 0 else 'выключено'}"
+        f" (доля {profiler.sample_rate})\n\n"
+        f"Снимков по обработчикам:\n{top}\n\n"
+        f"/profile on 0.1 - включить\n/profile off - выключить\n/profile dump - выгрузить файл"
+    )
 
 
 def hide_urls(text: str) -> str:
@@ -9,12 +9,13 @@ from aiogram.types import Message
 from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.testing.suite.test_reflection import users
 from app.filters.chat_types import ChatTypeFilter, IsAdmin
 from aiogram.types import KeyboardButton, ReplyKeyboardMarkup
 from sqlalchemy import select, func, update
 import time
 from collections import defaultdict
+from app.broadcaster import broadcast_dispatcher, send_photo_with_caption, get_file_id
+from app.catalog import BroadcastItem, broadcast_cache
 from app.fsm_states import BroadcastState, MailingState
 from app.keyboards.inline import (projects_keyboard, bc_courses_keyboard,
                                   admin_main_menu, add_back_button, admin_broadcast_menu, mailing_status_keyboard)
@@ -22,75 +23,46 @@ from app.keyboards.reply import kb_admin_main
 from database.models import User, Specialization, Course, Broadcast, Project, BroadcastCourseAssociation
 import logging
 from typing import Union, Optional
-from sqlalchemy import text
+from sqlalchemy import text as sql_text
 
 
 logger = logging.getLogger(__name__)
 
 
 
-admin_broadcast_router = Router()
+admin_broadcast_router = Router(name="admin_broadcast_router")
 admin_broadcast_router.message.filter(ChatTypeFilter(["private"]), IsAdmin())
 
 
-async def send_photo_with_caption(
-    recipient_id: int,
-    photo: Union[str, FSInputFile],
-    text: str,
-    bot: Bot,
-    reply_markup: Optional[InlineKeyboardMarkup] = None
-):
-    """Универсальная функция для отправки фото с подписью"""
+def broadcast_photo(broadcast: Union[Broadcast, BroadcastItem]) -> Union[str, FSInputFile]:
+    """Фото рассылки: file_id, если оно уже загружено в Telegram, иначе файл с диска"""
+    if broadcast.image_file_id:
+        return broadcast.image_file_id
+    if os.path.exists(broadcast.image_path):
+        return FSInputFile(broadcast.image_path)
+    return broadcast.image_path
+
+
+async def save_broadcast_file_id(session: AsyncSession,
+                                 broadcast: Union[Broadcast, BroadcastItem],
+                                 message: Optional[Message]):
+    """Сохранить file_id рассылки после первой загрузки фото с диска"""
+    file_id = get_file_id(message)
+    if broadcast.image_file_id or not file_id:
+        return
+
     try:
-        # Если photo - это путь к файлу
-        if isinstance(photo, str) and os.path.exists(photo):
-            photo_file = FSInputFile(photo)
-            if len(text) <= 1024:
-                await bot.send_photo(
-                    chat_id=recipient_id,
-                    photo=photo_file,
-                    caption=text,
-                    parse_mode="HTML",
-                    reply_markup=reply_markup
-                )
-            else:
-                await bot.send_photo(
-                    chat_id=recipient_id,
-                    photo=photo_file,
-                    parse_mode="HTML"
-                )
-                await bot.send_message(
-                    chat_id=recipient_id,
-                    text=text,
-                    parse_mode="HTML",
-                    disable_web_page_preview=True,
-                    reply_markup=reply_markup
-                )
-        else:
-            if len(text) <= 1024:
-                await bot.send_photo(
-                    chat_id=recipient_id,
-                    photo=photo,
-                    caption=text,
-                    parse_mode="HTML",
-                    reply_markup=reply_markup
-                )
-            else:
-                await bot.send_photo(
-                    chat_id=recipient_id,
-                    photo=photo,
-                    parse_mode="HTML"
-                )
-                await bot.send_message(
-                    chat_id=recipient_id,
-                    text=text,
-                    parse_mode="HTML",
-                    disable_web_page_preview=True,
-                    reply_markup=reply_markup
-                )
+        await session.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast.id)
+            .values(image_file_id=file_id)
+        )
+        await session.commit()
+        # В кэше осталась запись без file_id
+        broadcast_cache.forget(broadcast.id)
     except Exception as e:
-        logger.error(f"Ошибка при отправке фото: {e}", exc_info=True)
-        raise
+        await session.rollback()
+        logger.warning(f"Не удалось сохранить file_id рассылки {broadcast.id}: {e}")
 
 
 MEDIA_DIR = 'media/images'
@@ -297,11 +269,10 @@ async def select_course(callback: CallbackQuery, state: FSMContext,
 
         # Получаем обновленную клавиатуру
         search_query = data.get("course_search_query")
-        current_page = data.get("course_page", 0)
         keyboard = await bc_courses_keyboard(
             session,
             search_query=search_query,
-            page=current_page,
+            cursor=data.get("course_cursor"),
             selected_ids=selected_courses
         )
 
@@ -325,14 +296,13 @@ async def select_course(callback: CallbackQuery, state: FSMContext,
 async def courses_page_handler(callback: CallbackQuery, state: FSMContext,
                                session: AsyncSession):
     try:
-        _, page, search_query = callback.data.split("_", 2)
-        page = int(page)
+        _, cursor, search_query = callback.data.split("_", 2)
         if search_query == "":
             search_query = None
 
-        # Сохраняем текущую страницу и поисковый запрос
+        # Сохраняем курсор текущей страницы и поисковый запрос
         await state.update_data(
-            course_page=page,
+            course_cursor=cursor,
             course_search_query=search_query
         )
 
@@ -344,7 +314,7 @@ async def courses_page_handler(callback: CallbackQuery, state: FSMContext,
         keyboard = await bc_courses_keyboard(
             session,
             search_query=search_query,
-            page=page,
+            cursor=cursor,
             selected_ids=selected_courses
         )
 
@@ -382,7 +352,7 @@ async def process_search_query(message: Message, state: FSMContext,
     # Сохраняем поисковый запрос и сбрасываем страницу
     await state.update_data(
         course_search_query=search_query,
-        course_page=0
+        course_cursor=None
     )
 
     # Получаем выбранные курсы
@@ -393,7 +363,6 @@ async def process_search_query(message: Message, state: FSMContext,
     keyboard = await bc_courses_keyboard(
         session,
         search_query=search_query,
-        page=0,
         selected_ids=selected_courses
     )
 
@@ -483,13 +452,15 @@ async def finish_courses_selection(callback: CallbackQuery,
     # Если есть фото, отправляем его с подписью
     try:
         if photo:
-            await send_photo_with_caption(
+            preview_msg = await send_photo_with_caption(
                 recipient_id=callback.message.chat.id,
                 photo=photo,
                 text=message_text,
                 bot=bot,
                 reply_markup=builder.as_markup()
             )
+            # Фото уже загружено в Telegram - дальше рассылаем его по file_id
+            await state.update_data(photo_file_id=get_file_id(preview_msg))
         else:
             await callback.message.answer(
                 text=message_text,
@@ -519,6 +490,7 @@ async def confirm_broadcast(callback: CallbackQuery,
         data = await state.get_data()
         text = data.get("text", "")
         photo = data.get("photo")
+        photo_file_id = data.get("photo_file_id")
         project_id = data.get("project_id")
         selected_courses = data.get("selected_courses", [])
 
@@ -526,126 +498,53 @@ async def confirm_broadcast(callback: CallbackQuery,
             await callback.answer("❌ Не выбран ни один курс!", show_alert=True)
             return
 
-        # Получаем только необходимые данные пользователей
-        result = await session.execute(
-            select(User.tg_id, User.course_id)
+        total_users = await session.scalar(
+            select(func.count(User.id))
             .where(User.course_id.in_(selected_courses))
         )
-        users = result.all()
-
-        # Получаем статистику по курсам одним запросом
-        course_stats = {}
-        stats_result = await session.execute(
-            select(
-                Course.id,
-                Course.name,
-                func.count(User.id).label("total")
-            )
-            .join(User, User.course_id == Course.id)
-            .where(Course.id.in_(selected_courses))
-            .group_by(Course.id)
-        )
-
-        for course_id, name, total in stats_result:
-            course_stats[course_id] = {
-                "name": name,
-                "total": total,
-                "success": 0,
-                "failed": 0
-            }
-
-        total_users = len(users)
         if not total_users:
             await callback.answer("❌ Нет получателей у выбранных курсов!", show_alert=True)
             return
 
-        # Уведомление о начале рассылки
-        progress_msg = await callback.message.answer(
-            f"Рассылка для {total_users} пользователей...",
-            parse_mode="HTML"
-        )
-
-        # Отправка сообщений
-        success_count = 0
-        failed_count = 0
-
-        for tg_id, course_id in users:
-            try:
-                if photo:
-                    await send_photo_with_caption(
-                        recipient_id=tg_id,
-                        photo=photo,
-                        text=text,
-                        bot=bot
-                    )
-                else:
-                    await bot.send_message(
-                        chat_id=tg_id,
-                        text=text,
-                        disable_web_page_preview=True,
-                        parse_mode="HTML"
-                    )
-                success_count += 1
-                course_stats[course_id]["success"] += 1
-            except Exception as e:
-                failed_count += 1
-                course_stats[course_id]["failed"] += 1
-                logger.error(f"Ошибка отправки для {tg_id}: {str(e)}", exc_info=True)
-
-        # Сохранение рассылки в БД
+        # Сохранение рассылки в БД до начала отправки
         broadcast = Broadcast(
             text=text,
             image_path=photo,
-            is_sent=True,
+            image_file_id=photo_file_id,
+            is_sent=False,
             project_id=project_id,
-            is_active=True  # Добавлено явное указание is_active
+            is_active=True,  # Добавлено явное указание is_active
+            admin_chat_id=callback.message.chat.id
         )
-
-        # Убедитесь, что метод set_course_ids не пытается вызвать строку как функцию
-        if hasattr(broadcast, 'set_course_ids'):
-            await broadcast.set_course_ids(selected_courses, session)
-        else:
-            # Альтернативная реализация, если метод отсутствует
-            broadcast.course_ids = selected_courses
-
         session.add(broadcast)
 
         try:
-            await session.commit()
+            await session.flush()
         except IntegrityError as e:
             await session.rollback()
             if "broadcasts_pkey" in str(e):
-                # Сбрасываем последовательность
+                # Сбрасываем последовательность и повторяем вставку
                 await session.execute(
-                    text("SELECT setval('broadcasts_id_seq', (SELECT COALESCE(MAX(id), 1) FROM broadcasts))")
+                    sql_text("SELECT setval('broadcasts_id_seq', (SELECT COALESCE(MAX(id), 1) FROM broadcasts))")
                 )
-                await session.commit()
+                session.add(broadcast)
+                await session.flush()
             else:
                 raise
 
-        # Отправка отчета
-        report_lines = [
-            "📊 <b>Отчет о рассылке:</b>",
-            f"👥 Всего получателей: {total_users}",
-            f"✅ Успешно: {success_count}",
-            f"❌ Ошибки: {failed_count}",
-            "",
-            "<b>Статистика по курсам:</b>"
-        ]
-
-        for stats in course_stats.values():
-            report_lines.append(
-                f"• {stats['name']}: {stats['success']}/{stats['total']} "
-                f"(ошибок: {stats['failed']})"
-            )
+        # Курсы рассылки: одна проверка id и одна вставка ассоциаций
+        await broadcast.set_course_ids(selected_courses, session)
 
-        try:
-            await progress_msg.delete()
-        except:
-            pass
+        # Очередь доставки: одна строка на получателя
+        total_users = await broadcast.enqueue_deliveries(session)
+        await session.commit()
+
+        # Отправкой занимается фоновый диспетчер, отчет придет по завершении
+        broadcast_dispatcher.wake()
 
         await callback.message.answer(
-            "\n".join(report_lines),
+            f"🚀 Рассылка #{broadcast.id} запущена для {total_users} пользователей.\n"
+            "Прогресс отправки будет в следующем сообщении, отчет придет после завершения.",
             parse_mode="HTML",
             reply_markup=await admin_main_menu()
         )
@@ -661,6 +560,17 @@ async def confirm_broadcast(callback: CallbackQuery,
         await state.clear()
 
 
+# Остановка рассылки кнопкой из сообщения о прогрессе
+@admin_broadcast_router.callback_query(F.data.startswith("stop_broadcast:"))
+async def stop_broadcast(callback: CallbackQuery):
+    broadcast_id = int(callback.data.split(":")[-1])
+
+    if broadcast_dispatcher.cancel(broadcast_id):
+        await callback.answer("Рассылка останавливается...")
+    else:
+        await callback.answer("Рассылка уже завершена", show_alert=True)
+
+
 @admin_broadcast_router.callback_query(
     BroadcastState.confirmation,
     F.data == "cancel_broadcast"
@@ -7,15 +7,16 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from sqlalchemy import select, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
+from app.catalog import catalog_cache
 from app.filters.chat_types import ChatTypeFilter, IsAdmin
 from app.fsm_states import *
+from app.jobs import Job, import_pandas, job_runner
 from app.keyboards.inline import admin_courses_menu, confirm_cancel_add_courses, confirm_cancel_edit_courses, \
     admin_main_menu, confirm_delete_courses
 from database.models import *
 from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError
 from io import BytesIO
-import pandas as pd
 from aiogram.types import FSInputFile
 from sqlalchemy.orm import selectinload
 import tempfile
@@ -24,7 +25,7 @@ from aiogram.types import BufferedInputFile
 
 
 
-admin_course_router = Router()
+admin_course_router = Router(name="admin_course_router")
 admin_course_router.message.filter(ChatTypeFilter(["private"]), IsAdmin())
 
 
@@ -84,10 +85,18 @@ async def view_courses(callback: CallbackQuery,
 
 # Обработчик выгрузки в Excel
 @admin_course_router.callback_query(F.data == "courses:export")
-async def export_courses_to_excel(callback: CallbackQuery, session: AsyncSession):
-    try:
-        await callback.answer("⏳ Формируем файл...")
+async def export_courses_to_excel(callback: CallbackQuery):
+    # Файл формируется в фоне, обработчик сразу отвечает админу
+    await job_runner.submit(
+        "Выгрузка курсов",
+        courses_export_job,
+        chat_id=callback.message.chat.id
+    )
+    await callback.answer("⏳ Формируем файл...")
 
+
+async def courses_export_job(job: Job, session: AsyncSession):
+    try:
         # Получаем данные из БД
         result = await session.execute(
             select(Course)
@@ -97,7 +106,7 @@ async def export_courses_to_excel(callback: CallbackQuery, session: AsyncSession
         courses = result.scalars().all()
 
         if not courses:
-            await callback.message.answer("❗ Нет курсов для выгрузки")
+            await job.bot.send_message(chat_id=job.chat_id, text="❗ Нет курсов для выгрузки")
             return
 
         # Подготавливаем данные для Excel
@@ -110,6 +119,8 @@ async def export_courses_to_excel(callback: CallbackQuery, session: AsyncSession
                 "ID специализации": course.specialization_id
             })
 
+        pd = import_pandas()
+
         # Создаем DataFrame
         df = pd.DataFrame(data)
 
@@ -132,19 +143,16 @@ async def export_courses_to_excel(callback: CallbackQuery, session: AsyncSession
         excel_file = BufferedInputFile(excel_data, filename="courses_export.xlsx")
 
         # Отправляем файл пользователю
-        await callback.message.answer_document(
+        await job.bot.send_document(
+            chat_id=job.chat_id,
             document=excel_file,
             caption=f"📊 Выгрузка курсов ({len(courses)} записей)"
         )
 
-    except Exception as e:
-        logging.error(f"Ошибка при выгрузке курсов в Excel: {e}", exc_info=True)
-        await callback.message.answer("⚠️ Произошла ошибка при формировании файла")
     finally:
         # Удаляем временный файл
         if 'tmp' in locals() and os.path.exists(tmp.name):
             os.unlink(tmp.name)
-        await callback.answer()
 
 
 
@@ -274,6 +282,7 @@ async def confirm_add_course(callback: CallbackQuery,
         )
         session.add(new_course)
         await session.commit()
+        catalog_cache.invalidate()
 
         await callback.message.answer(
             f"✅ Курс успешно добавлен!\n\n"
@@ -540,6 +549,7 @@ async def confirm_edit_course(callback: CallbackQuery,
         course.name = data['new_name']
 
     await session.commit()
+    catalog_cache.invalidate()
 
     await callback.message.answer(
         f"Курс <b>{course.name}</b> успешно изменен",
@@ -717,6 +727,7 @@ async def process_course_deletion(callback: CallbackQuery,
 
         await session.delete(course)
         await session.commit()
+        catalog_cache.invalidate()
 
         await callback.message.edit_text(
             f"✅ Курс <b>{course.name}</b> успешно удален",
@@ -10,17 +10,18 @@ from sqlalchemy import select, func
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import selectinload
+from app.catalog import catalog_cache
 from app.filters.chat_types import ChatTypeFilter, IsAdmin
 from app.fsm_states import ProjectAddState, ProjectEditState, ProjectDeleteState
 from app.handlers.admin import hide_urls, extract_urls
+from app.jobs import Job, import_pandas, job_runner
 from app.keyboards.inline import admin_projects_menu, confirm_delete_keyboard, admin_main_menu, \
     confirm_cancel_add_projects, confirm_cancel_edit_projects
 from app.keyboards.reply import kb_admin_main
 from database.models import Project
-import pandas as pd
 
 
-admin_project_router = Router()
+admin_project_router = Router(name="admin_project_router")
 admin_project_router.message.filter(ChatTypeFilter(["private"]), IsAdmin())
 
 
@@ -76,126 +77,133 @@ async def view_projects(callback: CallbackQuery,
 
 # Хендлер для кнопки "Выгрузить в Excel"
 @admin_project_router.callback_query(F.data == "projects:export")
-async def export_projects_to_excel(callback: CallbackQuery, session: AsyncSession):
-    try:
-        # Получаем все проекты из базы данных
-        result = await session.execute(select(Project))
-        projects = result.scalars().all()
+async def export_projects_to_excel(callback: CallbackQuery):
+    # Файл формируется в фоне, обработчик сразу отвечает админу
+    await job_runner.submit(
+        "Выгрузка проектов",
+        projects_export_job,
+        chat_id=callback.message.chat.id
+    )
+    await callback.answer()
 
-        if not projects:
-            await callback.answer("📭 Список проектов пуст", show_alert=True)
-            return
 
-        # Создаем DataFrame со всеми полями модели
-        data = {
-            "ID": [],
-            "Название": [],
-            "Описание": [],
-            "Описание (оригинал)": [],
-            "Бенефиты": [],
-            "Бенефиты (оригинал)": [],
-            "Примеры": [],
-            "Примеры (оригинал)": [],
-            "Дата создания": [],
-            "Дата обновления": []
+async def projects_export_job(job: Job, session: AsyncSession):
+    # Получаем все проекты из базы данных
+    result = await session.execute(select(Project))
+    projects = result.scalars().all()
+
+    if not projects:
+        await job.bot.send_message(chat_id=job.chat_id, text="📭 Список проектов пуст")
+        return
+
+    # Создаем DataFrame со всеми полями модели
+    data = {
+        "ID": [],
+        "Название": [],
+        "Описание": [],
+        "Описание (оригинал)": [],
+        "Бенефиты": [],
+        "Бенефиты (оригинал)": [],
+        "Примеры": [],
+        "Примеры (оригинал)": [],
+        "Дата создания": [],
+        "Дата обновления": []
+    }
+
+    for project in projects:
+        data["ID"].append(project.id)
+        data["Название"].append(project.title)
+        data["Описание"].append(project.description)
+        data["Описание (оригинал)"].append(project.raw_description)
+        data["Бенефиты"].append(project.benefit)
+        data["Бенефиты (оригинал)"].append(project.raw_benefit)
+        data["Примеры"].append(project.example)
+        data["Примеры (оригинал)"].append(project.raw_example)
+        data["Дата создания"].append(project.created.strftime('%Y-%m-%d %H:%M') if project.created else None)
+        data["Дата обновления"].append(project.updated.strftime('%Y-%m-%d %H:%M') if project.updated else None)
+
+    pd = import_pandas()
+
+    df = pd.DataFrame(data)
+
+    # Создаем excel файл в памяти
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        df.to_excel(writer, index=False, sheet_name='Проекты')
+        workbook = writer.book
+        worksheet = writer.sheets['Проекты']
+
+        # Формат с переносом текста и выравниванием
+        wrap_format = workbook.add_format({
+            'text_wrap': True,
+            'valign': 'top',
+            'align': 'left'
+        })
+
+        # Формат для заголовков
+        header_format = workbook.add_format({
+            'bold': True,
+            'valign': 'top',
+            'align': 'left',
+            'text_wrap': True,
+            'bg_color': '#D7E4BC'  # Светло-зеленый фон для заголовков
+        })
+
+        # Формат для дат
+        date_format = workbook.add_format({
+            'num_format': 'yyyy-mm-dd hh:mm',
+            'valign': 'top',
+            'align': 'left'
+        })
+
+        # Устанавливаем ширину столбцов
+        column_widths = {
+            "ID": 10,
+            "Название": 30,
+            "Описание": 40,
+            "Описание (оригинал)": 40,
+            "Бенефиты": 40,
+            "Бенефиты (оригинал)": 40,
+            "Примеры": 40,
+            "Примеры (оригинал)": 40,
+            "Дата создания": 20,
+            "Дата обновления": 20
         }
 
-        for project in projects:
-            data["ID"].append(project.id)
-            data["Название"].append(project.title)
-            data["Описание"].append(project.description)
-            data["Описание (оригинал)"].append(project.raw_description)
-            data["Бенефиты"].append(project.benefit)
-            data["Бенефиты (оригинал)"].append(project.raw_benefit)
-            data["Примеры"].append(project.example)
-            data["Примеры (оригинал)"].append(project.raw_example)
-            data["Дата создания"].append(project.created.strftime('%Y-%m-%d %H:%M') if project.created else None)
-            data["Дата обновления"].append(project.updated.strftime('%Y-%m-%d %H:%M') if project.updated else None)
-
-        df = pd.DataFrame(data)
-
-        # Создаем excel файл в памяти
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Проекты')
-            workbook = writer.book
-            worksheet = writer.sheets['Проекты']
-
-            # Формат с переносом текста и выравниванием
-            wrap_format = workbook.add_format({
-                'text_wrap': True,
-                'valign': 'top',
-                'align': 'left'
-            })
-
-            # Формат для заголовков
-            header_format = workbook.add_format({
-                'bold': True,
-                'valign': 'top',
-                'align': 'left',
-                'text_wrap': True,
-                'bg_color': '#D7E4BC'  # Светло-зеленый фон для заголовков
-            })
-
-            # Формат для дат
-            date_format = workbook.add_format({
-                'num_format': 'yyyy-mm-dd hh:mm',
-                'valign': 'top',
-                'align': 'left'
-            })
-
-            # Устанавливаем ширину столбцов
-            column_widths = {
-                "ID": 10,
-                "Название": 30,
-                "Описание": 40,
-                "Описание (оригинал)": 40,
-                "Бенефиты": 40,
-                "Бенефиты (оригинал)": 40,
-                "Примеры": 40,
-                "Примеры (оригинал)": 40,
-                "Дата создания": 20,
-                "Дата обновления": 20
-            }
-
-            # Применяем настройки к каждому столбцу
-            for i, column in enumerate(df.columns):
-                col_format = wrap_format
-                if 'Дата' in column:
-                    col_format = date_format
-
-                worksheet.set_column(
-                    i, i,
-                    column_widths.get(column, 30),
-                    col_format
-                )
-
-            # Устанавливаем формат заголовков
-            for col_num, value in enumerate(df.columns.values):
-                worksheet.write(0, col_num, value, header_format)
-
-            # Автоподбор высоты строк для данных
-            for row_num in range(1, len(df) + 1):
-                worksheet.set_row(row_num, None, wrap_format)
-
-            # Добавляем автофильтр
-            worksheet.autofilter(0, 0, len(df), len(df.columns) - 1)
-
-            # Закрепляем заголовки
-            worksheet.freeze_panes(1, 0)
-
-        output.seek(0)
-
-        # Отправляем файл пользователю
-        await callback.message.answer_document(
-            document=BufferedInputFile(output.read(), filename="projects_export.xlsx"),
-            caption="📊 Полная выгрузка проектов в Excel"
-        )
-        await callback.answer()
+        # Применяем настройки к каждому столбцу
+        for i, column in enumerate(df.columns):
+            col_format = wrap_format
+            if 'Дата' in column:
+                col_format = date_format
 
-    except Exception as e:
-        logging.error(f"Error in export_projects_to_excel: {e}", exc_info=True)
-        await callback.answer("⚠️ Ошибка при выгрузке проектов", show_alert=True)
+            worksheet.set_column(
+                i, i,
+                column_widths.get(column, 30),
+                col_format
+            )
+
+        # Устанавливаем формат заголовков
+        for col_num, value in enumerate(df.columns.values):
+            worksheet.write(0, col_num, value, header_format)
+
+        # Автоподбор высоты строк для данных
+        for row_num in range(1, len(df) + 1):
+            worksheet.set_row(row_num, None, wrap_format)
+
+        # Добавляем автофильтр
+        worksheet.autofilter(0, 0, len(df), len(df.columns) - 1)
+
+        # Закрепляем заголовки
+        worksheet.freeze_panes(1, 0)
+
+    output.seek(0)
+
+    # Отправляем файл пользователю
+    await job.bot.send_document(
+        chat_id=job.chat_id,
+        document=BufferedInputFile(output.read(), filename="projects_export.xlsx"),
+        caption="📊 Полная выгрузка проектов в Excel"
+    )
 
 
 
@@ -337,6 +345,7 @@ async def confirm_project_add(callback: CallbackQuery,
 
     session.add(new_project)
     await session.commit()
+    catalog_cache.invalidate()
 
     await callback.message.answer("✅ Новый проект добавлен!",
                          reply_markup=await admin_projects_menu())
@@ -803,6 +812,7 @@ async def confirm_project_edit(callback: CallbackQuery,
         project.raw_example = data.get('new_raw_example', data['new_example'])
 
     await session.commit()
+    catalog_cache.invalidate()
 
     await callback.message.answer(
         f"Проект <b>{project.title}</b> успешно изменен",
@@ -905,6 +915,7 @@ async def confirm_project_delete(callback: CallbackQuery,
     if project:
         await session.delete(project)
         await session.commit()
+        catalog_cache.invalidate()
         await callback.message.answer(
             f"🗑️ Проект <b>{data['project_title']}</b> успешно удален!",
             parse_mode="HTML",
@@ -7,6 +7,7 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
+from app.catalog import catalog_cache
 from app.filters.chat_types import ChatTypeFilter, IsAdmin
 from app.fsm_states import *
 from app.keyboards.inline import admin_specializations_menu, confirm_cancel_add_specializations, \
@@ -17,7 +18,7 @@ from sqlalchemy import text
 
 
 
-admin_specialization_router = Router()
+admin_specialization_router = Router(name="admin_specialization_router")
 admin_specialization_router.message.filter(ChatTypeFilter(["private"]), IsAdmin())
 
 
@@ -134,6 +135,7 @@ async def confirm_add_specialization(callback: CallbackQuery,
 
         session.add(new_specialization)
         await session.commit()
+        catalog_cache.invalidate()
 
         await callback.message.answer("✅ Новая специализация добавлена!",
                                       reply_markup=await admin_specializations_menu())
@@ -299,6 +301,7 @@ async def confirm_edit_specialization(callback: CallbackQuery,
         specialization.name = data['new_name']
 
     await session.commit()
+    catalog_cache.invalidate()
 
     await callback.message.answer(
         f"Специализация <b>{specialization.name}</b> успешно изменена",
@@ -406,6 +409,7 @@ async def confirm_delete_specialization(callback: CallbackQuery,
     if specialization:
         await session.delete(specialization)
         await session.commit()
+        catalog_cache.invalidate()
         await callback.message.answer(
             f"🗑️ Специализация <b>{data['specialization_name']}</b> успешно удалена!",
             parse_mode="HTML",
@@ -1,6 +1,10 @@
+import asyncio
+import csv
+import gzip
 import io
 import logging
 import os
+import tempfile
 from aiofiles import open as aio_open
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm import state
@@ -17,17 +21,23 @@ from aiogram.types import KeyboardButton, ReplyKeyboardMarkup
 from sqlalchemy import select, func, distinct
 from datetime import datetime, timedelta
 from collections import defaultdict
-import pandas as pd
 from aiogram.types import BufferedInputFile
+from app.jobs import Job, import_pandas, job_runner
 from app.keyboards.inline import admin_main_menu
 from app.keyboards.reply import kb_admin_main, kb_main
 from database.models import User, Specialization, Course, Broadcast, BroadcastCourseAssociation, Project
+from database.orm_query import broadcasts_summary_query
 from datetime import datetime, time
 
 
-admin_stats_router = Router()
+admin_stats_router = Router(name="admin_stats_router")
 admin_stats_router.message.filter(ChatTypeFilter(["private"]), IsAdmin())
 
+# Сколько рассылок показывать на одной странице статистики
+MAILINGS_STATS_PAGE_SIZE = int(os.getenv('MAILINGS_STATS_PAGE_SIZE', 5))
+# Сколько строк за раз читается из БД при выгрузке пользователей
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 1000))
+
 
 
 @admin_stats_router.callback_query(F.data == 'admin_stats')
@@ -129,7 +139,10 @@ async def show_users_statistics(
     builder.row(
         InlineKeyboardButton(
             text="Выгрузить в Excel",
-            callback_data="export_users_excel")
+            callback_data="export_users_excel"),
+        InlineKeyboardButton(
+            text="Выгрузить в CSV (gzip)",
+            callback_data="export_users_csv")
     )
     builder.row(
         InlineKeyboardButton(
@@ -152,20 +165,16 @@ async def show_users_statistics(
     await callback.answer()
 
 async def get_course_stats(session: AsyncSession, sort_by: str = 'users', search_query: str = None):
-    query = select(
-        Course.name,
-        func.count(User.id).label("user_count")
-    ).join(User, Course.id == User.course_id, isouter=True)
+    user_count = Course.user_count.label("user_count")
+    query = select(Course.name, user_count)
 
     if search_query:
         query = query.where(Course.name.ilike(f"%{search_query}%"))
 
-    query = query.group_by(Course.id)
-
     if sort_by == 'name':
         query = query.order_by(Course.name.asc())
     else:  # 'users'
-        query = query.order_by(func.count(User.id).desc())
+        query = query.order_by(user_count.desc())
 
     result = await session.execute(query)
     return result.all()
@@ -292,8 +301,34 @@ async def process_search(message: Message, session: AsyncSession, state: FSMCont
 
 
 @admin_stats_router.callback_query(F.data == 'export_users_excel')
-async def export_users_to_excel(callback: CallbackQuery, session: AsyncSession):
-    # Получаем данные пользователей с информацией о курсах
+async def export_users_to_excel(callback: CallbackQuery):
+    # Выгрузка выполняется в фоне, обработчик сразу отвечает админу
+    await job_runner.submit(
+        "Выгрузка пользователей",
+        users_export_job,
+        chat_id=callback.message.chat.id
+    )
+    await callback.answer()
+
+
+@admin_stats_router.callback_query(F.data == 'export_users_csv')
+async def export_users_to_csv(callback: CallbackQuery):
+    await job_runner.submit(
+        "Выгрузка пользователей (CSV)",
+        users_csv_export_job,
+        chat_id=callback.message.chat.id
+    )
+    await callback.answer()
+
+
+USERS_EXPORT_COLUMNS = ['Имя', 'Фамилия', 'Username', 'Курс']
+
+
+async def stream_users(job: Job, session: AsyncSession):
+    """
+    Пользователи с названием курса пачками по EXPORT_CHUNK_SIZE строк.
+    Таблица не загружается в память целиком.
+    """
     query = (
         select(
             User.first_name,
@@ -303,23 +338,28 @@ async def export_users_to_excel(callback: CallbackQuery, session: AsyncSession):
         )
         .join(Course, User.course_id == Course.id, isouter=True)
         .order_by(User.id)
+        .execution_options(yield_per=EXPORT_CHUNK_SIZE)
     )
 
-    result = await session.execute(query)
-    users_data = result.all()
+    result = await session.stream(query)
+    processed = 0
+    async for rows in result.partitions():
+        yield [(u.first_name or '', u.last_name or '', u.username or '', u.course_name or '')
+               for u in rows]
+        processed += len(rows)
+        await job.progress(f"Выгружено пользователей: {processed}")
 
-    # Преобразуем данные в DataFrame
-    df = pd.DataFrame(
-        [(u.first_name or '', u.last_name or '', u.username or '', u.course_name or '')
-         for u in users_data],
-        columns=['Имя', 'Фамилия', 'Username', 'Курс']
-    )
 
-    # Создаем Excel файл в памяти
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name='Пользователи')
-        worksheet = writer.sheets['Пользователи']
+async def users_export_job(job: Job, session: AsyncSession):
+    # Файл пишется на диск построчно (constant_memory), а не собирается в памяти
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        import xlsxwriter
+
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        worksheet = workbook.add_worksheet('Пользователи')
+        header_format = workbook.add_format({'bold': True})
 
         # Настраиваем ширину колонок
         worksheet.set_column('A:A', 20)
@@ -327,16 +367,44 @@ async def export_users_to_excel(callback: CallbackQuery, session: AsyncSession):
         worksheet.set_column('C:C', 20)
         worksheet.set_column('D:D', 30)
 
-    # Подготавливаем файл для отправки
-    output.seek(0)
-    excel_file = BufferedInputFile(output.read(), filename='users_report.xlsx')
+        worksheet.write_row(0, 0, USERS_EXPORT_COLUMNS, header_format)
+        row_num = 1
+        async for rows in stream_users(job, session):
+            for row in rows:
+                worksheet.write_row(row_num, 0, row)
+                row_num += 1
 
-    # Отправляем файл
-    await callback.message.answer_document(
-        document=excel_file,
-        caption="📊 Отчет по пользователям"
-    )
-    await callback.answer()
+        # Упаковка xlsx блокирующая, выполняем ее вне event loop
+        await asyncio.to_thread(workbook.close)
+
+        await job.bot.send_document(
+            chat_id=job.chat_id,
+            document=FSInputFile(path, filename='users_report.xlsx'),
+            caption="📊 Отчет по пользователям"
+        )
+    finally:
+        os.unlink(path)
+
+
+async def users_csv_export_job(job: Job, session: AsyncSession):
+    # CSV со сжатием для очень больших выгрузок
+    fd, path = tempfile.mkstemp(suffix='.csv.gz')
+    os.close(fd)
+    try:
+        # utf-8-sig, чтобы Excel правильно открыл кириллицу
+        with gzip.open(path, 'wt', encoding='utf-8-sig', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(USERS_EXPORT_COLUMNS)
+            async for rows in stream_users(job, session):
+                writer.writerows(rows)
+
+        await job.bot.send_document(
+            chat_id=job.chat_id,
+            document=FSInputFile(path, filename='users_report.csv.gz'),
+            caption="📊 Отчет по пользователям (CSV)"
+        )
+    finally:
+        os.unlink(path)
 
 
 
@@ -356,41 +424,39 @@ class ExportMailingParams(StatesGroup):
 
 # Обработчик статистики по рассылкам
 @admin_stats_router.callback_query(F.data == 'stats_mailings')
+@admin_stats_router.callback_query(F.data.startswith('stats_mailings:'))
 async def show_mailings_statistics(callback: CallbackQuery, session: AsyncSession):
+    page = int(callback.data.split(":")[1]) if ":" in callback.data else 0
+
     # Получаем общую статистику по рассылкам
     total_mailings = await session.scalar(select(func.count()).select_from(Broadcast))
 
-    # Получаем детализированную информацию о последних 5 рассылках
-    latest_mailings_query = select(Broadcast).order_by(Broadcast.created.desc()).limit(5)
-    latest_mailings = await session.scalars(latest_mailings_query)
+    # Последние рассылки вместе с курсами и числом получателей - один запрос на страницу.
+    # Сначала выбираются id рассылок страницы, курсы и получатели считаются только для них
+    page_ids = (
+        select(Broadcast.id)
+        .order_by(Broadcast.created.desc(), Broadcast.id.desc())
+        .offset(page * MAILINGS_STATS_PAGE_SIZE)
+        .limit(MAILINGS_STATS_PAGE_SIZE)
+    )
+    latest_mailings = (await session.execute(
+        broadcasts_summary_query(session, separator="\n", broadcast_ids=page_ids)
+        .order_by(Broadcast.created.desc(), Broadcast.id.desc())
+    )).all()
 
     # Формируем текст сообщения
     text = [
         "<b>📊 Статистика рассылок</b>\n\n",
         f"• Всего рассылок: <b>{total_mailings}</b>\n\n",
-        "<b>Последние 5 рассылок:</b>\n"
+        f"<b>Последние рассылки (стр. {page + 1}):</b>\n"
     ]
 
     for mailing in latest_mailings:
-        # Получаем названия курсов для этой рассылки
-        courses_query = (
-            select(Course.name)
-            .join(BroadcastCourseAssociation, BroadcastCourseAssociation.course_id == Course.id)
-            .where(BroadcastCourseAssociation.broadcast_id == mailing.id)
-        )
-        courses = await session.scalars(courses_query)
-        course_names = [name for name in courses]
-
-        # Получаем количество получателей
-        recipients_count = await session.scalar(
-            select(func.count(User.id))
-            .join(BroadcastCourseAssociation, User.course_id == BroadcastCourseAssociation.course_id)
-            .where(BroadcastCourseAssociation.broadcast_id == mailing.id)
-        )
+        course_names = mailing.courses.split("\n") if mailing.courses else []
 
         # Форматируем дату и текст
-        date_str = mailing.created.strftime("%d.%m.%Y %H:%M") if mailing.created else "N/A"
-        short_text = (mailing.text[:125] + "...") if len(mailing.text) > 125 else mailing.text
+        date_str = mailing.date.strftime("%d.%m.%Y %H:%M") if mailing.date else "N/A"
+        short_text = (mailing.message[:125] + "...") if len(mailing.message) > 125 else mailing.message
 
         # Форматируем список курсов с нумерацией
         formatted_courses = ""
@@ -406,13 +472,24 @@ async def show_mailings_statistics(callback: CallbackQuery, session: AsyncSessio
             f"\n<b>#{mailing.id}</b>\n"
             f"<b>{date_str}</b>\n"
             f"Курсы:\n<b>{formatted_courses}</b>\n"
-            f"Получателей: <b>{recipients_count}</b>\n"
+            f"Получателей: <b>{mailing.recipients}</b>\n"
             f"Текст: <i>{short_text}</i>\n"
             "────────────────"
         )
 
     # Кнопки навигации
     builder = InlineKeyboardBuilder()
+    pagination = []
+    if page > 0:
+        pagination.append(InlineKeyboardButton(
+            text="⬅️ Новее",
+            callback_data=f"stats_mailings:{page - 1}"))
+    if (page + 1) * MAILINGS_STATS_PAGE_SIZE < total_mailings:
+        pagination.append(InlineKeyboardButton(
+            text="Старее ➡️",
+            callback_data=f"stats_mailings:{page + 1}"))
+    if pagination:
+        builder.row(*pagination)
     builder.row(
         InlineKeyboardButton(
             text="Выгрузить в Excel",
@@ -466,129 +543,124 @@ async def start_export_mailings(callback: CallbackQuery, state: FSMContext):
 
 
 @admin_stats_router.callback_query(F.data == 'export_all_mailings')
-async def export_all_mailings(callback: CallbackQuery, session: AsyncSession):
-    await generate_mailings_report(callback, session)
+async def export_all_mailings(callback: CallbackQuery):
+    await generate_mailings_report(callback)
     await callback.answer()
 
 
 async def generate_mailings_report(
     callback: CallbackQuery | Message,
-    session: AsyncSession,
     date_from: datetime | None = None,
     date_to: datetime | None = None,
     course_id: int | None = None,
     project_id: int | None = None
 ):
-    try:
-        # Базовый запрос без группировки по курсам и проектам
-        base_query = (
-            select(
-                Broadcast.id,
-                Broadcast.created.label("date"),
-                Broadcast.text.label("message"),
-                Project.title.label("project")
-            )
-            .outerjoin(Project, Broadcast.project_id == Project.id)
+    """Поставить формирование отчета по рассылкам в фоновую очередь"""
+    message = callback.message if isinstance(callback, CallbackQuery) else callback
+
+    async def report_job(job: Job, session: AsyncSession):
+        await mailings_report_job(
+            job, session,
+            date_from=date_from,
+            date_to=date_to,
+            course_id=course_id,
+            project_id=project_id
         )
 
-        # Применяем фильтры по датам
-        if date_from and date_to:
-            date_to_end = datetime.combine(date_to.date(), time(23, 59, 59))
-            base_query = base_query.where(Broadcast.created.between(date_from, date_to_end))
-        elif date_from:
-            base_query = base_query.where(Broadcast.created >= date_from)
-        elif date_to:
-            date_to_end = datetime.combine(date_to.date(), time(23, 59, 59))
-            base_query = base_query.where(Broadcast.created <= date_to_end)
-
-        if project_id:
-            base_query = base_query.where(Project.id == project_id)
-
-        # Получаем все рассылки
-        mailings = (await session.execute(base_query)).all()
-
-        if not mailings:
-            error_msg = "Нет данных для выбранных параметров фильтрации"
-            if isinstance(callback, CallbackQuery):
-                await callback.message.answer(error_msg)
-            else:
-                await callback.answer(error_msg)
-            return
+    await job_runner.submit("Отчет по рассылкам", report_job, chat_id=message.chat.id)
 
-        # Для каждой рассылки получаем курсы и количество получателей
-        result_data = []
-        for mailing in mailings:
-            # Получаем курсы для рассылки
-            courses_query = (
-                select(Course.name)
-                .join(BroadcastCourseAssociation, BroadcastCourseAssociation.course_id == Course.id)
-                .where(BroadcastCourseAssociation.broadcast_id == mailing.id)
-            )
-            courses = (await session.execute(courses_query)).scalars().all()
 
-            # Получаем количество получателей
-            recipients_count = await session.scalar(
-                select(func.count(User.id))
-                .join(BroadcastCourseAssociation, User.course_id == BroadcastCourseAssociation.course_id)
-                .where(BroadcastCourseAssociation.broadcast_id == mailing.id)
-            )
+def build_mailings_report(result_data: list[dict]) -> bytes:
+    """Excel-файл отчета по рассылкам"""
+    pd = import_pandas()
 
-            # Формируем строку для отчета
-            result_data.append({
-                "Дата": mailing.date.strftime("%d.%m.%Y %H:%M") if mailing.date else "",
-                "Проект": mailing.project or "Не указан",
-                "Курсы": ", ".join(courses) if courses else "Нет курсов",
-                "Получателей": recipients_count or 0,
-                "Текст рассылки": mailing.message
-            })
-
-        # Создаем DataFrame
-        df = pd.DataFrame(result_data)
-
-        # Создаем Excel файл
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Рассылки')
-            worksheet = writer.sheets['Рассылки']
-
-            # Настраиваем ширину колонок
-            worksheet.set_column('A:A', 20)  # Дата
-            worksheet.set_column('B:B', 25)  # Проект
-            worksheet.set_column('C:C', 30)  # Курсы
-            worksheet.set_column('D:D', 15)  # Получателей
-            worksheet.set_column('E:E', 50)  # Текст рассылки
-
-        # Подготавливаем файл для отправки
-        output.seek(0)
-        filename = f"mailings_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        excel_file = BufferedInputFile(output.read(), filename=filename)
-
-        # Создаем клавиатуру с кнопкой "Назад"
-        back_button = InlineKeyboardBuilder()
-        back_button.row(
-            InlineKeyboardButton(
-                text="⬅️ Назад",
-                callback_data="export_mailings"
-            )
+    # Создаем DataFrame
+    df = pd.DataFrame(result_data)
+
+    # Создаем Excel файл
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        df.to_excel(writer, index=False, sheet_name='Рассылки')
+        worksheet = writer.sheets['Рассылки']
+
+        # Настраиваем ширину колонок
+        worksheet.set_column('A:A', 20)  # Дата
+        worksheet.set_column('B:B', 25)  # Проект
+        worksheet.set_column('C:C', 30)  # Курсы
+        worksheet.set_column('D:D', 15)  # Получателей
+        worksheet.set_column('E:E', 50)  # Текст рассылки
+
+    return output.getvalue()
+
+
+async def mailings_report_job(
+    job: Job,
+    session: AsyncSession,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    course_id: int | None = None,
+    project_id: int | None = None
+):
+    # Рассылки вместе с курсами и числом получателей - один запрос
+    base_query = broadcasts_summary_query(session)
+
+    # Применяем фильтры по датам
+    if date_from and date_to:
+        date_to_end = datetime.combine(date_to.date(), time(23, 59, 59))
+        base_query = base_query.where(Broadcast.created.between(date_from, date_to_end))
+    elif date_from:
+        base_query = base_query.where(Broadcast.created >= date_from)
+    elif date_to:
+        date_to_end = datetime.combine(date_to.date(), time(23, 59, 59))
+        base_query = base_query.where(Broadcast.created <= date_to_end)
+
+    if project_id:
+        base_query = base_query.where(Project.id == project_id)
+
+    # Получаем все рассылки
+    mailings = (await session.execute(base_query.order_by(Broadcast.created))).all()
+
+    if not mailings:
+        await job.bot.send_message(
+            chat_id=job.chat_id,
+            text="Нет данных для выбранных параметров фильтрации"
         )
+        return
 
-        # Отправляем файл
-        if isinstance(callback, CallbackQuery):
-            await callback.message.answer_document(
-                document=excel_file,
-                caption="📊 Отчет по рассылкам",
-                reply_markup=back_button.as_markup()
-            )
-        else:
-            await callback.answer_document(
-                document=excel_file,
-                caption="📊 Отчет по рассылкам",
-                reply_markup=back_button.as_markup()
-            )
+    await job.progress(f"Формирование файла: {len(mailings)} рассылок", force=True)
+
+    result_data = [
+        {
+            "Дата": mailing.date.strftime("%d.%m.%Y %H:%M") if mailing.date else "",
+            "Проект": mailing.project or "Не указан",
+            "Курсы": mailing.courses or "Нет курсов",
+            "Получателей": mailing.recipients,
+            "Текст рассылки": mailing.message
+        }
+        for mailing in mailings
+    ]
+
+    # DataFrame и упаковка xlsx блокирующие, выполняем их вне event loop
+    report = await asyncio.to_thread(build_mailings_report, result_data)
+    filename = f"mailings_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    excel_file = BufferedInputFile(report, filename=filename)
+
+    # Создаем клавиатуру с кнопкой "Назад"
+    back_button = InlineKeyboardBuilder()
+    back_button.row(
+        InlineKeyboardButton(
+            text="⬅️ Назад",
+            callback_data="export_mailings"
+        )
+    )
 
-    except Exception as e:
-        logging.error(f"Ошибка при формировании отчета: {str(e)}", exc_info=True)
-        await callback.answer("⚠️ Произошла ошибка при формировании отчета")
+    # Отправляем файл
+    await job.bot.send_document(
+        chat_id=job.chat_id,
+        document=excel_file,
+        caption="📊 Отчет по рассылкам",
+        reply_markup=back_button.as_markup()
+    )
 
 
 @admin_stats_router.callback_query(F.data == 'set_date_range')
@@ -602,7 +674,8 @@ async def set_date_range(callback: CallbackQuery, state: FSMContext):
 async def process_date_from(message: Message, state: FSMContext):
     try:
         date_from = datetime.strptime(message.text, "%d.%m.%Y")
-        await state.update_data(date_from=date_from)
+        # В FSM храним строку, чтобы данные сериализовались в любом хранилище
+        await state.update_data(date_from=date_from.isoformat())
         await message.answer("Введите конечную дату в формате ДД.ММ.ГГГГ (или 'нет' для одной даты):")
         await state.set_state(ExportMailingParams.DATE_TO)
     except ValueError:
@@ -612,7 +685,7 @@ async def process_date_from(message: Message, state: FSMContext):
 @admin_stats_router.message(ExportMailingParams.DATE_TO)
 async def process_date_to(message: Message, state: FSMContext, session: AsyncSession):
     data = await state.get_data()
-    date_from = data.get('date_from')
+    date_from = datetime.fromisoformat(data['date_from']) if data.get('date_from') else None
 
     if message.text.lower() != 'нет':
         try:
@@ -626,7 +699,6 @@ async def process_date_to(message: Message, state: FSMContext, session: AsyncSes
     await state.clear()
     await generate_mailings_report(
         callback=message,
-        session=session,
         date_from=date_from,
         date_to=date_to
     )
@@ -664,7 +736,6 @@ async def process_course_selection(callback: CallbackQuery, session: AsyncSessio
     course_id = int(callback.data.split('_')[-1])
     await generate_mailings_report(
         callback=callback,
-        session=session,
         course_id=course_id
     )
     await callback.answer()
@@ -702,7 +773,6 @@ async def process_project_selection(callback: CallbackQuery, session: AsyncSessi
     project_id = int(callback.data.split('_')[-1])
     await generate_mailings_report(
         callback=callback,
-        session=session,
         project_id=project_id
     )
     await callback.answer()
@@ -7,7 +7,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.models import Project
 
-common_router = Router()
+common_router = Router(name="common_router")
 
 # Обработчик кнопки "О Factory"
 @common_router.message(F.text == "О Factory")
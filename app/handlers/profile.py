@@ -6,13 +6,15 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from app.fsm_states import ChangeCourseState
+from app.catalog import broadcast_cache
+from app.handlers.admin_broadcast import broadcast_photo, save_broadcast_file_id
 from app.keyboards.inline import *
 from app.keyboards.reply import kb_main
 from database.models import *
 from aiogram.exceptions import TelegramBadRequest
 
 
-profile_router = Router()
+profile_router = Router(name="profile_router")
 
 
 @profile_router.message(F.text == "Мой курс")
@@ -205,7 +207,7 @@ async def show_course_broadcasts(callback: CallbackQuery, session: AsyncSession,
 
         # Получаем рассылки для курса
         stmt = (
-            select(Broadcast)
+            select(Broadcast.id)
             .join(Broadcast.course_associations)
             .where(
                 Broadcast.is_sent == True,
@@ -214,27 +216,29 @@ async def show_course_broadcasts(callback: CallbackQuery, session: AsyncSession,
             )
             .order_by(Broadcast.id.desc())
         )
-        broadcasts_list = (await session.scalars(stmt)).all()
+        # В состоянии храним только id рассылок, содержимое читается по одной при показе
+        broadcast_ids = list((await session.scalars(stmt)).all())
 
-        if not broadcasts_list:
+        if not broadcast_ids:
             await callback.answer("Нет доступных мероприятий для этого курса", show_alert=True)
             return
 
         # Отправляем первую рассылку и сохраняем сообщения
         new_messages = await send_broadcast_with_pagination(
             callback=callback,
-            broadcasts=broadcasts_list,
+            broadcast_ids=broadcast_ids,
             index=0,
             course_id=course_id,
-            total=len(broadcasts_list),
-            last_messages=[]  # Пустой список для первого сообщения
+            total=len(broadcast_ids),
+            last_messages=[],  # Пустой список для первого сообщения
+            session=session
         )
 
         # Сохраняем состояние
         await state.update_data(
             last_messages=new_messages,
             current_index=0,
-            broadcasts_list=broadcasts_list,
+            broadcast_ids=broadcast_ids,
             course_id=course_id
         )
 
@@ -244,15 +248,16 @@ async def show_course_broadcasts(callback: CallbackQuery, session: AsyncSession,
 
 async def send_broadcast_with_pagination(
         callback: CallbackQuery,
-        broadcasts: list[Broadcast],
+        broadcast_ids: list[int],
         index: int,
         course_id: int,
         total: int,
+        session: AsyncSession,
         last_messages: list[int] = None
 ):
     """Функция пагинации для курсовых рассылок"""
     try:
-        if index < 0 or index >= len(broadcasts):
+        if index < 0 or index >= len(broadcast_ids):
             await callback.answer("Недопустимый индекс рассылки", show_alert=True)
             return
 
@@ -267,7 +272,10 @@ async def send_broadcast_with_pagination(
                 except Exception as e:
                     await callback.message.answer(f"Не удалось удалить сообщение {msg_id}: {e}")
 
-        broadcast = broadcasts[index]
+        broadcast = await broadcast_cache.get(session, broadcast_ids[index])
+        if broadcast is None:
+            await callback.answer("Рассылка больше недоступна", show_alert=True)
+            return
         pagination_text = f"<b>Мероприятие {index + 1} из {total}</b>"
         main_text = broadcast.text
         full_text = f"{main_text}\n\n{pagination_text}"
@@ -294,18 +302,18 @@ async def send_broadcast_with_pagination(
         # Отправляем контент
         if broadcast.image_path:
             try:
-                photo = FSInputFile(broadcast.image_path) if os.path.exists(
-                    broadcast.image_path) else broadcast.image_path
+                # file_id из БД или файл с диска, если фото еще не загружалось
+                photo = broadcast_photo(broadcast)
 
                 if len(full_text) <= 1024:
-                    msg = await callback.message.bot.send_photo(
+                    photo_msg = await callback.message.bot.send_photo(
                         chat_id=callback.message.chat.id,
                         photo=photo,
                         caption=full_text,
                         reply_markup=markup,
                         parse_mode="HTML"
                     )
-                    current_messages.append(msg.message_id)
+                    current_messages.append(photo_msg.message_id)
                 else:
                     photo_msg = await callback.message.bot.send_photo(
                         chat_id=callback.message.chat.id,
@@ -321,6 +329,8 @@ async def send_broadcast_with_pagination(
                         parse_mode="HTML"
                     )
                     current_messages.append(text_msg.message_id)
+
+                await save_broadcast_file_id(session, broadcast, photo_msg)
             except Exception as e:
                 error_msg = await callback.message.bot.send_message(
                     chat_id=callback.message.chat.id,
@@ -355,10 +365,10 @@ async def prev_course_broadcast(callback: CallbackQuery, session: AsyncSession,
         data = await state.get_data()
         last_messages = data.get("last_messages", [])
         current_index = data.get("current_index", 0)
-        broadcasts_list = data.get("broadcasts_list", [])
+        broadcast_ids = data.get("broadcast_ids", [])
         course_id = data.get("course_id")
 
-        if not broadcasts_list:
+        if not broadcast_ids:
             await callback.answer("Нет доступных рассылок", show_alert=True)
             return
 
@@ -366,11 +376,12 @@ async def prev_course_broadcast(callback: CallbackQuery, session: AsyncSession,
 
         new_messages = await send_broadcast_with_pagination(
             callback=callback,
-            broadcasts=broadcasts_list,
+            broadcast_ids=broadcast_ids,
             index=new_index,
             course_id=course_id,
-            total=len(broadcasts_list),
-            last_messages=last_messages
+            total=len(broadcast_ids),
+            last_messages=last_messages,
+            session=session
         )
 
         await state.update_data(
@@ -388,22 +399,23 @@ async def next_course_broadcast(callback: CallbackQuery, session: AsyncSession,
         data = await state.get_data()
         last_messages = data.get("last_messages", [])
         current_index = data.get("current_index", 0)
-        broadcasts_list = data.get("broadcasts_list", [])
+        broadcast_ids = data.get("broadcast_ids", [])
         course_id = data.get("course_id")
 
-        if not broadcasts_list:
+        if not broadcast_ids:
             await callback.answer("Нет доступных рассылок", show_alert=True)
             return
 
-        new_index = min(len(broadcasts_list) - 1, current_index + 1)
+        new_index = min(len(broadcast_ids) - 1, current_index + 1)
 
         new_messages = await send_broadcast_with_pagination(
             callback=callback,
-            broadcasts=broadcasts_list,
+            broadcast_ids=broadcast_ids,
             index=new_index,
             course_id=course_id,
-            total=len(broadcasts_list),
-            last_messages=last_messages
+            total=len(broadcast_ids),
+            last_messages=last_messages,
+            session=session
         )
 
         await state.update_data(
@@ -10,12 +10,13 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload, selectinload
-from app.handlers.admin_broadcast import send_photo_with_caption
+from app.catalog import broadcast_cache
+from app.handlers.admin_broadcast import send_photo_with_caption, broadcast_photo, save_broadcast_file_id
 from app.keyboards.inline import projects_keyboard, view_projects_keyboard, ProjectCallbackFilter, \
     project_details_message, get_project_details_keyboard, view_project_kb
 from database.models import User, Broadcast, BroadcastCourseAssociation, Project, Course
 
-projects_router = Router()
+projects_router = Router(name="projects_router")
 
 logger = logging.getLogger(__name__)
 
@@ -220,7 +221,7 @@ async def show_available_broadcasts(callback: CallbackQuery,
 
         # Получаем рассылки для проекта и курса пользователя
         stmt = (
-            select(Broadcast)
+            select(Broadcast.id)
             .join(Broadcast.course_associations)
             .where(
                 Broadcast.project_id == project_id,
@@ -230,28 +231,30 @@ async def show_available_broadcasts(callback: CallbackQuery,
             )
             .order_by(Broadcast.id.desc())
         )
-        broadcasts_list = (await session.scalars(stmt)).all()
+        # В состоянии храним только id рассылок, содержимое читается по одной при показе
+        broadcast_ids = list((await session.scalars(stmt)).all())
 
-        if not broadcasts_list:
+        if not broadcast_ids:
             await callback.answer("Нет доступных рассылок для вашего курса", show_alert=True)
             return
 
         # Отправляем первую рассылку и сохраняем сообщения
         new_messages = await send_broadcast_with_pagination(
             callback=callback,
-            broadcasts=broadcasts_list,
+            broadcast_ids=broadcast_ids,
             index=0,
             project_id=project_id,
-            total=len(broadcasts_list),
+            total=len(broadcast_ids),
             user_course_id=user.course_id,
-            last_messages=[]  # Пустой список для первого сообщения
+            last_messages=[],  # Пустой список для первого сообщения
+            session=session
         )
 
         # Сохраняем состояние
         await state.update_data(
             last_messages=new_messages,
             current_index=0,
-            broadcasts_list=broadcasts_list,
+            broadcast_ids=broadcast_ids,
             project_id=project_id,
             user_course_id=user.course_id
         )
@@ -263,16 +266,17 @@ async def show_available_broadcasts(callback: CallbackQuery,
 
 async def send_broadcast_with_pagination(
         callback: CallbackQuery,
-        broadcasts: list[Broadcast],
+        broadcast_ids: list[int],
         index: int,
         project_id: int,
         total: int,
         user_course_id: int,
+        session: AsyncSession,
         last_messages: list[int] = None  # Для хранения ID всех сообщений (фото+текст)
 ):
     """Функция пагинации с правильной обработкой фото и текста"""
     try:
-        if index < 0 or index >= len(broadcasts):
+        if index < 0 or index >= len(broadcast_ids):
             await callback.answer("Недопустимый индекс рассылки", show_alert=True)
             return
 
@@ -287,7 +291,10 @@ async def send_broadcast_with_pagination(
                 except Exception as e:
                     logger.warning(f"Не удалось удалить сообщение {msg_id}: {e}")
 
-        broadcast = broadcasts[index]
+        broadcast = await broadcast_cache.get(session, broadcast_ids[index])
+        if broadcast is None:
+            await callback.answer("Рассылка больше недоступна", show_alert=True)
+            return
         pagination_text = f"<b>Мероприятие {index + 1} из {total}</b>"
         main_text = broadcast.text
         full_text = f"{main_text}\n\n{pagination_text}"
@@ -317,20 +324,19 @@ async def send_broadcast_with_pagination(
         # Отправляем контент
         if broadcast.image_path:
             try:
-                # Определяем тип фото
-                photo = FSInputFile(broadcast.image_path) if os.path.exists(
-                    broadcast.image_path) else broadcast.image_path
+                # file_id из БД или файл с диска, если фото еще не загружалось
+                photo = broadcast_photo(broadcast)
 
                 if len(full_text) <= 1024:
                     # Короткий текст - отправляем одним сообщением
-                    msg = await callback.message.bot.send_photo(
+                    photo_msg = await callback.message.bot.send_photo(
                         chat_id=callback.message.chat.id,
                         photo=photo,
                         caption=full_text,
                         reply_markup=markup,
                         parse_mode="HTML"
                     )
-                    current_messages.append(msg.message_id)
+                    current_messages.append(photo_msg.message_id)
                 else:
                     # Длинный текст - отправляем фото и текст отдельно
                     photo_msg = await callback.message.bot.send_photo(
@@ -347,6 +353,8 @@ async def send_broadcast_with_pagination(
                         parse_mode="HTML"
                     )
                     current_messages.append(text_msg.message_id)
+
+                await save_broadcast_file_id(session, broadcast, photo_msg)
             except Exception as e:
                 logger.error(f"Ошибка при отправке фото: {e}", exc_info=True)
                 error_msg = await callback.message.bot.send_message(
@@ -386,11 +394,11 @@ async def prev_broadcast(callback: CallbackQuery, session: AsyncSession, state:
         data = await state.get_data()
         last_messages = data.get("last_messages", [])
         current_index = data.get("current_index", 0)
-        broadcasts_list = data.get("broadcasts_list", [])
+        broadcast_ids = data.get("broadcast_ids", [])
         project_id = data.get("project_id")
         user_course_id = data.get("user_course_id")
 
-        if not broadcasts_list:
+        if not broadcast_ids:
             await callback.answer("Нет доступных рассылок", show_alert=True)
             return
 
@@ -399,12 +407,13 @@ async def prev_broadcast(callback: CallbackQuery, session: AsyncSession, state:
         # Отправляем предыдущую рассылку
         new_messages = await send_broadcast_with_pagination(
             callback=callback,
-            broadcasts=broadcasts_list,
+            broadcast_ids=broadcast_ids,
             index=new_index,
             project_id=project_id,
-            total=len(broadcasts_list),
+            total=len(broadcast_ids),
             user_course_id=user_course_id,
-            last_messages=last_messages
+            last_messages=last_messages,
+            session=session
         )
 
         # Сохраняем новые данные
@@ -424,25 +433,26 @@ async def next_broadcast(callback: CallbackQuery, session: AsyncSession, state:
         data = await state.get_data()
         last_messages = data.get("last_messages", [])
         current_index = data.get("current_index", 0)
-        broadcasts_list = data.get("broadcasts_list", [])
+        broadcast_ids = data.get("broadcast_ids", [])
         project_id = data.get("project_id")
         user_course_id = data.get("user_course_id")
 
-        if not broadcasts_list:
+        if not broadcast_ids:
             await callback.answer("Нет доступных рассылок", show_alert=True)
             return
 
-        new_index = min(len(broadcasts_list) - 1, current_index + 1)
+        new_index = min(len(broadcast_ids) - 1, current_index + 1)
 
         # Отправляем следующую рассылку
         new_messages = await send_broadcast_with_pagination(
             callback=callback,
-            broadcasts=broadcasts_list,
+            broadcast_ids=broadcast_ids,
             index=new_index,
             project_id=project_id,
-            total=len(broadcasts_list),
+            total=len(broadcast_ids),
             user_course_id=user_course_id,
-            last_messages=last_messages
+            last_messages=last_messages,
+            session=session
         )
 
         # Сохраняем новые данные
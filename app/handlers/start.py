@@ -14,7 +14,7 @@ from app.text import *
 from database.models import *
 
 
-start_router = Router()
+start_router = Router(name="start_router")
 
 
 @start_router.message(CommandStart())
@@ -1,11 +1,12 @@
 from string import punctuation
 from aiogram import F, Bot, types, Router
 from aiogram.filters import Command
+from app.admins import admin_registry
 from app.filters.chat_types import ChatTypeFilter
 
 
 
-user_group_router = Router()
+user_group_router = Router(name="user_group_router")
 user_group_router.message.filter(ChatTypeFilter(["group", "supergroup"]))
 user_group_router.edited_message.filter(ChatTypeFilter(["group", "supergroup"]))
 
@@ -20,7 +21,8 @@ async def get_admins(message: types.Message, bot: Bot):
         for member in admins_list
         if member.status == "creator" or member.status == "administrator"
     ]
-    bot.admins_list = admins_list
+    # Список хранится в БД, чтобы его видели все процессы бота
+    await admin_registry.set(admins_list)
     if message.from_user.id in admins_list:
         await message.delete()
     print(admins_list)
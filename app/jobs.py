@@ -0,0 +1,147 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.metrics import create_background_task
+
+
+logger = logging.getLogger(__name__)
+
+
+# Сколько тяжелых задач (выгрузки, отчеты) может выполняться одновременно
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+# Минимальный интервал между обновлениями сообщения о прогрессе, сек.
+PROGRESS_INTERVAL = 3.0
+
+
+class Job:
+    """Фоновая задача админа со статусным сообщением и кнопкой отмены"""
+
+    def __init__(self, job_id: int, name: str, bot: Bot, chat_id: int):
+        self.id = job_id
+        self.name = name
+        self.bot = bot
+        self.chat_id = chat_id
+        self.status_message_id: Optional[int] = None
+        self.task: Optional[asyncio.Task] = None
+        self._last_progress = 0.0
+
+    def cancel_keyboard(self) -> InlineKeyboardMarkup:
+        builder = InlineKeyboardBuilder()
+        builder.button(text="❌ Отменить", callback_data=f"cancel_job:{self.id}")
+        return builder.as_markup()
+
+    async def progress(self, text: str, force: bool = False):
+        """Обновить статусное сообщение (не чаще раза в PROGRESS_INTERVAL)"""
+        now = time.monotonic()
+        if not force and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        await self.set_status(f"⏳ <b>{self.name}</b>\n\n{text}", self.cancel_keyboard())
+
+    async def set_status(self, text: str,
+                         reply_markup: Optional[InlineKeyboardMarkup] = None):
+        if self.status_message_id is None:
+            return
+        try:
+            await self.bot.edit_message_text(
+                chat_id=self.chat_id,
+                message_id=self.status_message_id,
+                text=text,
+                parse_mode="HTML",
+                reply_markup=reply_markup
+            )
+        except TelegramBadRequest:
+            pass  # Игнорируем, если сообщение не изменилось
+        except Exception as e:
+            logger.warning(f"Не удалось обновить статус задачи {self.id}: {e}")
+
+
+JobFunc = Callable[[Job, AsyncSession], Awaitable[Any]]
+
+
+def import_pandas():
+    """pandas для выгрузок в Excel: загружается при первой выгрузке, а не при старте бота"""
+    import pandas
+    return pandas
+
+
+class JobRunner:
+    """
+    Выполнение долгих операций админа вне обработчика апдейта.
+    Задача получает собственную сессию БД, поэтому обработчик
+    сразу отвечает админу и освобождает свою сессию.
+    """
+
+    def __init__(self, max_concurrency: int = JOB_WORKERS):
+        self.max_concurrency = max_concurrency
+        self.jobs: Dict[int, Job] = {}
+        self.bot: Optional[Bot] = None
+        self.session_pool: Optional[async_sessionmaker] = None
+        self._ids = itertools.count(1)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def start(self, bot: Bot, session_pool: async_sessionmaker):
+        self.bot = bot
+        self.session_pool = session_pool
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def stop(self):
+        tasks = [job.task for job in self.jobs.values() if job.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def submit(self, name: str, func: JobFunc, chat_id: int) -> Job:
+        """
+        Поставить задачу в очередь.
+        :param name: Название задачи для статусного сообщения
+        :param func: Корутина func(job, session)
+        :param chat_id: Чат, в который отправляются статус и результат
+        """
+        job = Job(next(self._ids), name, self.bot, chat_id)
+        status_msg = await self.bot.send_message(
+            chat_id=chat_id,
+            text=f"⏳ <b>{name}</b>\n\nЗадача в очереди...",
+            parse_mode="HTML",
+            reply_markup=job.cancel_keyboard()
+        )
+        job.status_message_id = status_msg.message_id
+
+        self.jobs[job.id] = job
+        job.task = create_background_task(self._run(job, func))
+        return job
+
+    def cancel(self, job_id: int) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or job.task is None or job.task.done():
+            return False
+        job.task.cancel()
+        return True
+
+    async def _run(self, job: Job, func: JobFunc):
+        try:
+            async with self._semaphore:
+                await job.progress("Выполняется...", force=True)
+                async with self.session_pool() as session:
+                    await func(job, session)
+            await job.set_status(f"✅ <b>{job.name}</b>: готово")
+        except asyncio.CancelledError:
+            await job.set_status(f"❌ <b>{job.name}</b>: отменено")
+        except Exception as e:
+            logger.error(f"Ошибка в задаче '{job.name}': {e}", exc_info=True)
+            await job.set_status(f"⚠️ <b>{job.name}</b>: ошибка при выполнении")
+        finally:
+            self.jobs.pop(job.id, None)
+
+
+job_runner = JobRunner()
@@ -1,9 +1,9 @@
 from aiogram.filters import Filter
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from mypyc.irbuild import builder
-from sqlalchemy import or_
+from sqlalchemy import or_, tuple_, literal
 
+from app.catalog import catalog_cache, keyboard_cache
 from database.models import *
 
 
@@ -13,10 +13,9 @@ from database.models import *
 
 
 # Выбор специализации
+@keyboard_cache.memoize
 async def specialization_keyboard(session: AsyncSession):
-    specialization_stmt = select(Specialization)
-    result = await session.execute(specialization_stmt)
-    specializations = result.scalars().all()
+    specializations = await catalog_cache.specializations(session)
 
     inline_keyboard = []
     for specialization in specializations:
@@ -28,15 +27,15 @@ async def specialization_keyboard(session: AsyncSession):
 
 
 # Выбор курсов с пагинацией
+@keyboard_cache.memoize
 async def courses_keyboard(session: AsyncSession, specialization_id: int,
                            page: int = 0):
     items_per_page = 4
     start_index = page * items_per_page
 
-    # Запрос курсов только по нужной специализации
-    stmt = select(Course).where(Course.specialization_id == specialization_id).offset(start_index).limit(items_per_page)
-    result = await session.execute(stmt)
-    current_courses = result.scalars().all()
+    # Курсы только по нужной специализации
+    courses = await catalog_cache.courses(session, specialization_id)
+    current_courses = courses[start_index:start_index + items_per_page]
 
     # Если курсы не найдены на первой странице
     if not current_courses and page == 0:
@@ -62,14 +61,7 @@ async def courses_keyboard(session: AsyncSession, specialization_id: int,
         )
 
     # Проверяем, есть ли следующая страница
-    next_page_stmt = (
-        select(Course)
-        .where(Course.specialization_id == specialization_id)
-        .offset((page + 1) * items_per_page)
-        .limit(1)
-    )
-    next_page_result = await session.execute(next_page_stmt)
-    if next_page_result.scalars().first():
+    if len(courses) > start_index + items_per_page:
         navigation_buttons.append(
             InlineKeyboardButton(
                 text="➡️ Вперед",
@@ -91,8 +83,7 @@ async def courses_keyboard(session: AsyncSession, specialization_id: int,
 # Проекты - обзор проектов (первый уровень)
 async def view_projects_keyboard(session: AsyncSession):
     builder = InlineKeyboardBuilder()
-    result = await session.execute(select(Project))
-    projects = result.scalars().all()
+    projects = await catalog_cache.projects(session)
 
     for project in projects:
         builder.button(
@@ -111,10 +102,10 @@ class ProjectCallbackFilter(Filter):
     async def __call__(self, callback: CallbackQuery) -> bool:
         return callback.data.startswith(self.prefix)
 
+@keyboard_cache.memoize
 async def view_project_kb(session: AsyncSession):
     builder = InlineKeyboardBuilder()
-    result = await session.execute(select(Project))
-    projects = result.scalars().all()
+    projects = await catalog_cache.projects(session)
 
     for project in projects:
         builder.button(
@@ -127,11 +118,12 @@ async def view_project_kb(session: AsyncSession):
     return builder.as_markup()
 
 # Кнопка для каждого проекта
+@keyboard_cache.memoize
 async def get_project_details_keyboard(project_id: int, session: AsyncSession):
     builder = InlineKeyboardBuilder()
 
-    # Получаем проект из базы данных
-    project = await session.get(Project, project_id)
+    # Получаем проект из кэша справочников
+    project = await catalog_cache.project(session, project_id)
     if not project:
         raise ValueError("Project not found")
 
@@ -186,10 +178,9 @@ async def project_details_message(project: Project) -> str:
 
 
 # Изменение специализации
+@keyboard_cache.memoize
 async def change_specialization_keyboard(session: AsyncSession):
-    specialization_stmt = select(Specialization)
-    result = await session.execute(specialization_stmt)
-    specializations = result.scalars().all()
+    specializations = await catalog_cache.specializations(session)
 
     inline_keyboard = []
     for specialization in specializations:
@@ -201,21 +192,16 @@ async def change_specialization_keyboard(session: AsyncSession):
 
 
 # Изменение курса с пагинацией
+@keyboard_cache.memoize
 async def change_courses_keyboard(session: AsyncSession,
                                   specialization_id: int,
                                   page: int = 0):
     items_per_page = 4
     start_index = page * items_per_page
 
-    # Запрос курсов только по нужной специализации
-    stmt = (
-        select(Course)
-        .where(Course.specialization_id == specialization_id)
-        .offset(start_index)
-        .limit(items_per_page)
-    )
-    result = await session.execute(stmt)
-    current_courses = result.scalars().all()
+    # Курсы только по нужной специализации
+    courses = await catalog_cache.courses(session, specialization_id)
+    current_courses = courses[start_index:start_index + items_per_page]
 
     # Если курсы не найдены на первой странице
     if not current_courses and page == 0:
@@ -234,10 +220,7 @@ async def change_courses_keyboard(session: AsyncSession,
                                  callback_data=f"changepage_{specialization_id}_{page - 1}"))
 
     # Проверяем, есть ли следующая страница
-    next_page_stmt = select(Course).where(Course.specialization_id == specialization_id).offset(
-        (page + 1) * items_per_page).limit(1)
-    next_page_result = await session.execute(next_page_stmt)
-    if next_page_result.scalars().first():
+    if len(courses) > start_index + items_per_page:
         navigation_buttons.append(
             InlineKeyboardButton(text="➡️ Вперед",
                                  callback_data=f"changepage_{specialization_id}_{page + 1}"))
@@ -253,6 +236,7 @@ async def change_courses_keyboard(session: AsyncSession,
 # =====================================================================================
 
 # Главное меню админа
+@keyboard_cache.memoize
 async def admin_main_menu():
     builder = InlineKeyboardBuilder()
 
@@ -277,6 +261,7 @@ async def admin_main_menu():
 # ------------------------------------- Проекты ---------------------------------------
 
 # Главное меню управления проектами
+@keyboard_cache.memoize
 async def admin_projects_menu():
     builder = InlineKeyboardBuilder()
 
@@ -340,6 +325,7 @@ async def confirm_delete_keyboard():
 
 
 # Главное меню управления специализациями
+@keyboard_cache.memoize
 async def admin_specializations_menu():
     builder = InlineKeyboardBuilder()
 
@@ -415,6 +401,7 @@ async def confirm_delete_specializations():
 
 
 # Главное меню управления курсами
+@keyboard_cache.memoize
 async def admin_courses_menu():
     builder = InlineKeyboardBuilder()
 
@@ -491,6 +478,7 @@ async def confirm_delete_courses():
 
 
 # Главное меню управления рассылками
+@keyboard_cache.memoize
 async def admin_broadcast_menu():
     builder = InlineKeyboardBuilder()
 
@@ -516,30 +504,53 @@ async def admin_broadcast_menu():
 async def bc_courses_keyboard(
         session: AsyncSession,
         search_query: str = None,
-        page: int = 0,
+        cursor: str = None,
         per_page: int = 6,
         selected_ids: list[int] = None
 ):
+    """
+    Клавиатура выбора курсов с keyset-пагинацией по (name, id).
+    :param cursor: "n<id>" - страница после курса id, "p<id>" - страница перед ним,
+                   None - первая страница
+    """
     builder = InlineKeyboardBuilder()
 
     if selected_ids is None:
         selected_ids = []
 
-    query = select(Course)
+    query = select(Course.id, Course.name)
     if search_query:
         query = query.where(Course.name.ilike(f"%{search_query}%"))
 
-    # Добавляем сортировку по имени курса
-    query = query.order_by(Course.name.asc())
-
-    query = query.offset(page * per_page).limit(per_page)
-    result = await session.execute(query)
-    courses = result.scalars().all()
-
-    # Сортируем курсы по имени (уже отсортированы в запросе, но для надежности)
-    sorted_courses = sorted(courses, key=lambda c: c.name)
-
-    for course in sorted_courses:
+    direction, boundary_id = (cursor[0], int(cursor[1:])) if cursor else (None, None)
+    if boundary_id is not None:
+        boundary = tuple_(
+            select(Course.name).where(Course.id == boundary_id).scalar_subquery(),
+            literal(boundary_id)
+        )
+        key = tuple_(Course.name, Course.id)
+        query = query.where(key < boundary if direction == "p" else key > boundary)
+
+    # Берем на одну запись больше, чтобы узнать, есть ли еще страница
+    if direction == "p":
+        query = query.order_by(Course.name.desc(), Course.id.desc())
+    else:
+        query = query.order_by(Course.name.asc(), Course.id.asc())
+    courses = (await session.execute(query.limit(per_page + 1))).all()
+
+    # Граничный курс удалили или поиск изменился - начинаем с первой страницы
+    if not courses and cursor:
+        return await bc_courses_keyboard(session, search_query, None, per_page, selected_ids)
+
+    has_more = len(courses) > per_page
+    courses = courses[:per_page]
+    if direction == "p":
+        courses.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = direction == "n", has_more
+
+    for course in courses:
         # Добавляем галочку для выбранных курсов
         prefix = "✅ " if course.id in selected_ids else ""
         builder.button(
@@ -551,20 +562,19 @@ async def bc_courses_keyboard(
 
     # Навигация
     nav_buttons = []
-    if page > 0:
+    if has_prev:
         nav_buttons.append(
             InlineKeyboardButton(
                 text="⬅️ Назад",
-                callback_data=f"bcpage_{page - 1}_{search_query or ''}"
+                callback_data=f"bcpage_p{courses[0].id}_{search_query or ''}"
             )
         )
 
-    next_page = await session.execute(query.offset((page + 1) * per_page).limit(1))
-    if next_page.scalars().first():
+    if has_next:
         nav_buttons.append(
             InlineKeyboardButton(
                 text="➡️ Вперед",
-                callback_data=f"bcpage_{page + 1}_{search_query or ''}"
+                callback_data=f"bcpage_n{courses[-1].id}_{search_query or ''}"
             )
         )
 
@@ -597,8 +607,7 @@ async def add_back_button(builder: InlineKeyboardBuilder, back_state: str = "men
 async def projects_keyboard(session: AsyncSession):
     builder = InlineKeyboardBuilder()
 
-    result = await session.execute(select(Project))
-    projects = result.scalars().all()
+    projects = await catalog_cache.projects(session)
 
     for project in projects:
         builder.button(
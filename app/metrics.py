@@ -0,0 +1,385 @@
+import asyncio
+import bisect
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, TelegramObject
+from aiohttp import web
+from sqlalchemy import event
+
+from app.catalog import broadcast_cache, catalog_cache, keyboard_cache
+from database.engine import engine, pool_metrics
+from middlewares.db import db_usage
+
+
+logger = logging.getLogger(__name__)
+
+
+# Порт HTTP-эндпоинта /metrics. 0 - не запускать
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9200))
+# Больше серий на обработчики не заводим, остальное попадает в "other"
+MAX_HANDLER_SERIES = 500
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Сколько одинаковых запросов за апдейт считается признаком N+1
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv('SQL_N_PLUS_ONE_THRESHOLD', 5))
+# Допустимое число запросов за апдейт, если у обработчика нет флага query_budget. 0 - без ограничения
+SQL_QUERY_BUDGET = int(os.getenv('SQL_QUERY_BUDGET', 30))
+# Превышение бюджета - исключение, а не предупреждение (разработка и тесты)
+SQL_BUDGET_STRICT = os.getenv('SQL_BUDGET_STRICT', 'false').lower() == 'true'
+
+# Списки параметров IN (...) разной длины считаются одним запросом
+PARAMS_LIST = re.compile(r"\((?:\s*(?:\?|\$\d+|%s|%\(\w+\)s)\s*,)+\s*(?:\?|\$\d+|%s|%\(\w+\)s)\s*\)")
+
+# Префикс callback_data: "stats_mailings:2" -> "stats_mailings", "view_project_5" -> "view_project"
+CALLBACK_PREFIX = re.compile(r"[A-Za-z]+(?:_[A-Za-z]+(?=_|$))*")
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: observe() только увеличивает счетчики"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str = "") -> List[str]:
+        prefix = f"{labels}," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+class HandlerSeries:
+    __slots__ = ("name", "latency", "db_queries", "errors")
+
+    def __init__(self, name: str):
+        # "router:handler" создается один раз, а не на каждый апдейт
+        self.name = name
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.db_queries = Histogram(COUNT_BUCKETS)
+        self.errors = 0
+
+
+class QueryBudgetExceeded(Exception):
+    """Обработчик выполнил больше SQL-запросов, чем ему разрешено"""
+
+
+class UpdateStats:
+    """Счетчики текущего апдейта"""
+
+    __slots__ = ("api_calls", "db_queries", "statements", "handler", "track_statements")
+
+    def __init__(self, track_statements: bool = True):
+        # Текст запроса -> сколько раз выполнен, создается при первом запросе
+        self.statements: Optional[Counter] = None
+        self.reset(track_statements)
+
+    def reset(self, track_statements: bool):
+        """Подготовить объект к следующему апдейту (UpdateMetrics переиспользует их)"""
+        self.api_calls = 0
+        self.db_queries = 0
+        if self.statements:
+            self.statements.clear()
+        # "router:handler", заполняется при вызове обработчика
+        self.handler = None
+        # Тексты запросов нужны только для поиска N+1
+        self.track_statements = track_statements
+
+    def repeated_statements(self, threshold: int = SQL_N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int]]:
+        """Запросы одной формы, выполненные не меньше threshold раз"""
+        if not self.statements:
+            return []
+        shapes: Counter = Counter()
+        for statement, count in self.statements.items():
+            shapes[PARAMS_LIST.sub("(...)", " ".join(statement.split()))] += count
+        return [(shape, count) for shape, count in shapes.most_common() if count >= threshold]
+
+
+current_update: ContextVar[Optional[UpdateStats]] = ContextVar("current_update", default=None)
+
+
+class Metrics:
+    """Метрики процесса бота в формате Prometheus"""
+
+    def __init__(self):
+        self.updates = 0
+        self.update_latency = Histogram(LATENCY_BUCKETS)
+        self.api_calls_per_update = Histogram(COUNT_BUCKETS)
+        self.db_queries_per_update = Histogram(COUNT_BUCKETS)
+        self.api_calls: Dict[str, int] = {}
+        self.api_errors = 0
+        self.db_queries = 0
+        self.handlers: Dict[Tuple[str, str, str], HandlerSeries] = {}
+        # Предупреждения о N+1 и превышения бюджета запросов по обработчикам
+        self.n_plus_one: Dict[str, int] = {}
+        self.budget_exceeded: Dict[str, int] = {}
+
+    def handler_series(self, router: str, handler: str, prefix: str) -> HandlerSeries:
+        key = (router, handler, prefix)
+        series = self.handlers.get(key)
+        if series is None:
+            if len(self.handlers) >= MAX_HANDLER_SERIES:
+                key = (router, handler, "other")
+                series = self.handlers.get(key)
+            if series is None:
+                series = self.handlers[key] = HandlerSeries(f"{router}:{handler}")
+        return series
+
+    def render(self) -> str:
+        lines = [
+            "# TYPE bot_updates_total counter",
+            f"bot_updates_total {self.updates}",
+            "# TYPE bot_update_duration_seconds histogram",
+            *self.update_latency.render("bot_update_duration_seconds"),
+            "# TYPE bot_update_api_calls histogram",
+            *self.api_calls_per_update.render("bot_update_api_calls"),
+            "# TYPE bot_update_db_queries histogram",
+            *self.db_queries_per_update.render("bot_update_db_queries"),
+            "# TYPE bot_handler_duration_seconds histogram",
+        ]
+        for (router, handler, prefix), series in self.handlers.items():
+            labels = f'router="{router}",handler="{handler}",callback="{prefix}"'
+            lines.extend(series.latency.render("bot_handler_duration_seconds", labels))
+        lines.append("# TYPE bot_handler_db_queries histogram")
+        for (router, handler, prefix), series in self.handlers.items():
+            labels = f'router="{router}",handler="{handler}",callback="{prefix}"'
+            lines.extend(series.db_queries.render("bot_handler_db_queries", labels))
+        lines.append("# TYPE bot_handler_errors_total counter")
+        for (router, handler, prefix), series in self.handlers.items():
+            labels = f'router="{router}",handler="{handler}",callback="{prefix}"'
+            lines.append(f"bot_handler_errors_total{{{labels}}} {series.errors}")
+
+        lines.append("# TYPE bot_api_calls_total counter")
+        for method, count in self.api_calls.items():
+            lines.append(f'bot_api_calls_total{{method="{method}"}} {count}')
+        lines.append(f"bot_api_errors_total {self.api_errors}")
+        lines.append(f"bot_db_queries_total {self.db_queries}")
+        lines.append("# TYPE bot_n_plus_one_total counter")
+        for handler, count in self.n_plus_one.items():
+            lines.append(f'bot_n_plus_one_total{{handler="{handler}"}} {count}')
+        lines.append("# TYPE bot_query_budget_exceeded_total counter")
+        for handler, count in self.budget_exceeded.items():
+            lines.append(f'bot_query_budget_exceeded_total{{handler="{handler}"}} {count}')
+
+        for name, value in db_usage.stats().items():
+            lines.append(f'bot_db_session_updates{{kind="{name}"}} {value}')
+        for name, value in pool_metrics().items():
+            lines.append(f"bot_db_pool_{name} {value}")
+        for cache_name, cache in (("catalog", catalog_cache), ("keyboard", keyboard_cache),
+                                  ("broadcast", broadcast_cache)):
+            for name, value in cache.stats().items():
+                lines.append(f'bot_cache_{name}{{cache="{cache_name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def check_queries(stats: UpdateStats, budget: Optional[int] = None):
+    """
+    Проверить запросы апдейта: повторяющиеся запросы одной формы (N+1)
+    и превышение бюджета. budget - флаг обработчика query_budget,
+    например @router.callback_query(..., flags={"query_budget": 3}).
+    """
+    handler = stats.handler or "unknown"
+    for shape, count in stats.repeated_statements():
+        metrics.n_plus_one[handler] = metrics.n_plus_one.get(handler, 0) + 1
+        logger.warning(f"Возможный N+1 в {handler}: запрос выполнен {count} раз: {shape[:300]}")
+
+    budget = budget or SQL_QUERY_BUDGET
+    if budget and stats.db_queries > budget:
+        metrics.budget_exceeded[handler] = metrics.budget_exceeded.get(handler, 0) + 1
+        text = f"{handler}: {stats.db_queries} SQL-запросов при бюджете {budget}"
+        if SQL_BUDGET_STRICT:
+            raise QueryBudgetExceeded(text)
+        logger.warning(f"Превышен бюджет запросов, {text}")
+
+
+@contextmanager
+def count_queries() -> Iterator[UpdateStats]:
+    """
+    Посчитать запросы внутри блока (для тестов и отладки):
+
+        with count_queries() as stats:
+            await show_mailings_statistics(callback, session)
+        assert stats.db_queries <= 3 and not stats.repeated_statements()
+    """
+    if not event.contains(engine.sync_engine, "before_cursor_execute", _count_query):
+        event.listen(engine.sync_engine, "before_cursor_execute", _count_query)
+    stats = UpdateStats()
+    token = current_update.set(stats)
+    try:
+        yield stats
+    finally:
+        current_update.reset(token)
+
+
+def create_background_task(coro: Awaitable[Any]) -> asyncio.Task:
+    """
+    asyncio.create_task для работы, которая переживает апдейт (задачи админа):
+    задача наследует контекст обработчика, и без сброса ее запросы
+    засчитывались бы уже обработанному апдейту.
+    """
+    async def detached():
+        current_update.set(None)
+        return await coro
+
+    return asyncio.create_task(detached())
+
+
+def callback_prefix(event: TelegramObject) -> str:
+    if not isinstance(event, CallbackQuery) or not event.data:
+        return ""
+    match = CALLBACK_PREFIX.match(event.data.split(":", 1)[0])
+    return match.group(0) if match else "other"
+
+
+class UpdateMetrics(BaseMiddleware):
+    """
+    Outer-middleware апдейта: общее время и число запросов к API и БД за апдейт.
+    Счетчики апдейтов берутся из пула и возвращаются в него, поэтому на апдейт
+    не создается новых объектов. Тексты запросов (для поиска N+1) собираются
+    только в строгом режиме SQL_BUDGET_STRICT и при уровне логов DEBUG.
+    """
+
+    def __init__(self):
+        self._free: List[UpdateStats] = []
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        track_statements = SQL_BUDGET_STRICT or logger.isEnabledFor(logging.DEBUG)
+        if self._free:
+            stats = self._free.pop()
+            stats.reset(track_statements)
+        else:
+            stats = UpdateStats(track_statements)
+        token = current_update.set(stats)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            metrics.updates += 1
+            metrics.update_latency.observe(time.perf_counter() - start)
+            metrics.api_calls_per_update.observe(stats.api_calls)
+            metrics.db_queries_per_update.observe(stats.db_queries)
+            current_update.reset(token)
+            self._free.append(stats)
+
+
+class HandlerMetrics(BaseMiddleware):
+    """Время и ошибки обработчиков по роутеру, имени обработчика и префиксу callback_data"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        router = data["event_router"].name
+        handler_name = data["handler"].callback.__name__
+        series = metrics.handler_series(router, handler_name, callback_prefix(event))
+        stats = current_update.get()
+        if stats is not None:
+            stats.handler = series.name
+            queries_before = stats.db_queries
+
+        start = time.perf_counter()
+        try:
+            result = await handler(event, data)
+        except Exception:
+            series.errors += 1
+            raise
+        finally:
+            series.latency.observe(time.perf_counter() - start)
+
+        if stats is not None:
+            series.db_queries.observe(stats.db_queries - queries_before)
+            check_queries(stats, get_flag(data, "query_budget"))
+        return result
+
+
+class ApiCallMetrics(BaseRequestMiddleware):
+    """Счетчик запросов к Telegram Bot API"""
+
+    async def __call__(self, make_request, bot: Bot, method):
+        name = type(method).__name__
+        metrics.api_calls[name] = metrics.api_calls.get(name, 0) + 1
+        stats = current_update.get()
+        if stats is not None:
+            stats.api_calls += 1
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            metrics.api_errors += 1
+            raise
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    metrics.db_queries += 1
+    stats = current_update.get()
+    if stats is not None:
+        stats.db_queries += 1
+        if stats.track_statements:
+            if stats.statements is None:
+                stats.statements = Counter()
+            stats.statements[statement] += 1
+
+
+def setup_metrics(dp: Dispatcher, bot: Bot):
+    """Подключить сбор метрик к диспетчеру, боту и движку БД"""
+    dp.update.outer_middleware(UpdateMetrics())
+    handler_metrics = HandlerMetrics()
+    # Middleware диспетчера aiogram применяет ко всем вложенным роутерам
+    for name, observer in dp.observers.items():
+        if name != "update":
+            observer.middleware(handler_metrics)
+    bot.session.middleware(ApiCallMetrics())
+    event.listen(engine.sync_engine, "before_cursor_execute", _count_query)
+
+
+async def start_metrics_server(port: int = METRICS_PORT) -> Optional[web.AppRunner]:
+    if not port:
+        return None
+
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, METRICS_HOST, port).start()
+    logger.info(f"Метрики доступны на http://{METRICS_HOST}:{port}/metrics")
+    return runner
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import os
+import random
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from app.metrics import UpdateStats, current_update
+
+
+logger = logging.getLogger(__name__)
+
+
+# Доля апдейтов, которые профилируются (0 - профилирование выключено)
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+# Интервал между снимками стека, мс
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', 5))
+# Куда сохраняются файлы collapsed stacks для flamegraph
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+MAX_STACK_DEPTH = 100
+
+
+class SamplingProfiler:
+    """
+    Семплирующий профайлер апдейтов.
+    Фоновый поток раз в interval снимает стек потока event loop, и если в этот
+    момент выполняется выбранный для профилирования апдейт, стек засчитывается
+    его обработчику. Результат сохраняется в формате collapsed stacks
+    (flamegraph.pl, speedscope): "обработчик;кадр;кадр... число_снимков".
+    """
+
+    def __init__(self, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 interval_ms: float = PROFILE_INTERVAL_MS):
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000
+        self.samples: Counter = Counter()
+        # Задачи профилируемых апдейтов и их счетчики (в них metrics пишет имя обработчика)
+        self._active: Dict[asyncio.Task, UpdateStats] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Запомнить event loop процесса и запустить поток, если профилирование включено"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        if self.sample_rate > 0:
+            self._start_thread()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def enable(self, sample_rate: float):
+        self.sample_rate = sample_rate
+        self._start_thread()
+        logger.info(f"Профилирование включено, доля апдейтов {sample_rate}")
+
+    def disable(self):
+        self.sample_rate = 0
+        self.stop()
+        logger.info("Профилирование выключено")
+
+    def _start_thread(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        task = asyncio.current_task(self._loop)
+        stats = self._active.get(task)
+        if stats is None:
+            return
+        frame = sys._current_frames().get(self._loop_thread_id)
+
+        stack = []
+        while frame is not None and len(stack) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        stack.append(stats.handler or "dispatch")
+        with self._lock:
+            self.samples[";".join(reversed(stack))] += 1
+
+    def track(self, task: asyncio.Task, stats: UpdateStats):
+        self._active[task] = stats
+
+    def untrack(self, task: asyncio.Task):
+        self._active.pop(task, None)
+
+    def top_handlers(self, limit: int = 10) -> List[Tuple[str, int]]:
+        """Обработчики с наибольшим числом снимков"""
+        totals: Counter = Counter()
+        with self._lock:
+            for stack, count in self.samples.items():
+                totals[stack.split(";", 1)[0]] += count
+        return totals.most_common(limit)
+
+    def dump(self, directory: str = PROFILE_DIR) -> Optional[str]:
+        """Сохранить накопленные стеки в файл и начать накопление заново"""
+        with self._lock:
+            samples, self.samples = self.samples, Counter()
+        if not samples:
+            return None
+
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"profile-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}.collapsed")
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, count in samples.most_common():
+                file.write(f"{stack} {count}\n")
+        logger.info(f"Профиль сохранен: {path}, снимков {sum(samples.values())}")
+        return path
+
+
+profiler = SamplingProfiler()
+
+
+class ProfilerMiddleware(BaseMiddleware):
+    """Отбирает долю апдейтов для профилирования (подключается после UpdateMetrics)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if profiler.sample_rate <= 0 or random.random() >= profiler.sample_rate:
+            return await handler(event, data)
+
+        task = asyncio.current_task()
+        profiler.track(task, current_update.get() or UpdateStats())
+        try:
+            return await handler(event, data)
+        finally:
+            profiler.untrack(task)
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import os
+import queue
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+from aiohttp import web
+
+
+logger = logging.getLogger(__name__)
+
+
+# Сколько процессов обрабатывают апдейты. 0 - как раньше, всё в одном процессе
+BOT_WORKERS = int(os.getenv('BOT_WORKERS', 0))
+# Таймаут long polling в процессе-приемнике, сек.
+POLLING_TIMEOUT = 30
+
+# Поля апдейта, в которых лежит объект с чатом или пользователем
+UPDATE_FIELDS = (
+    "message", "edited_message", "channel_post", "edited_channel_post",
+    "business_message", "edited_business_message", "callback_query",
+    "my_chat_member", "chat_member", "chat_join_request", "message_reaction",
+    "inline_query", "chosen_inline_result", "shipping_query", "pre_checkout_query",
+    "poll_answer",
+)
+
+
+def update_chat_id(update: Dict[str, Any]) -> int:
+    """Чат апдейта (или пользователь, если чата нет) - по нему апдейты распределяются между воркерами"""
+    for field in UPDATE_FIELDS:
+        event = update.get(field)
+        if not event:
+            continue
+        # У callback_query чат находится во вложенном сообщении
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        user = event.get("from") or event.get("user")
+        if user:
+            return user["id"]
+    return 0
+
+
+def worker_for(update: Dict[str, Any], workers: int) -> int:
+    """Номер воркера для апдейта: все апдейты одного чата попадают в один воркер"""
+    return update_chat_id(update) % workers
+
+
+class ChatOrderedFeeder:
+    """
+    Обработка апдейтов воркером: разные чаты обрабатываются параллельно,
+    апдейты одного чата - строго по очереди, в порядке поступления.
+    """
+
+    def __init__(self, feed: Callable[[Dict[str, Any]], Awaitable[Any]]):
+        self.feed = feed
+        # Последняя задача каждого чата, следующая ждет ее завершения
+        self._tails: Dict[int, asyncio.Task] = {}
+
+    def submit(self, update: Dict[str, Any]):
+        chat_id = update_chat_id(update)
+        previous = self._tails.get(chat_id)
+        task = asyncio.create_task(self._process(previous, update))
+        self._tails[chat_id] = task
+        task.add_done_callback(lambda done: self._release(chat_id, done))
+
+    def _release(self, chat_id: int, task: asyncio.Task):
+        if self._tails.get(chat_id) is task:
+            del self._tails[chat_id]
+
+    async def _process(self, previous: Optional[asyncio.Task], update: Dict[str, Any]):
+        if previous is not None:
+            # Ошибка предыдущего апдейта не должна останавливать очередь чата
+            await asyncio.wait({previous})
+        try:
+            await self.feed(update)
+        except Exception as e:
+            logger.error(f"Ошибка обработки апдейта {update.get('update_id')}: {e}", exc_info=True)
+
+    async def wait(self):
+        """Дождаться обработки уже принятых апдейтов"""
+        if self._tails:
+            await asyncio.wait(set(self._tails.values()))
+
+
+async def consume_updates(updates_queue, feed: Callable[[Dict[str, Any]], Awaitable[Any]]):
+    """Читать апдейты из очереди процесса-приемника, пока не придет None"""
+    feeder = ChatOrderedFeeder(feed)
+    while True:
+        try:
+            # Короткий таймаут, чтобы поток не блокировал остановку процесса
+            update = await asyncio.to_thread(updates_queue.get, timeout=1)
+        except queue.Empty:
+            continue
+        if update is None:
+            break
+        feeder.submit(update)
+    await feeder.wait()
+
+
+async def poll_updates(bot: Bot, allowed_updates: List[str],
+                       dispatch: Callable[[Dict[str, Any]], None]):
+    """Long polling в процессе-приемнике: апдейты не обрабатываются, а передаются воркерам"""
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(
+                offset=offset,
+                timeout=POLLING_TIMEOUT,
+                allowed_updates=allowed_updates
+            )
+        except TelegramRetryAfter as e:
+            await asyncio.sleep(e.retry_after)
+            continue
+        except TelegramNetworkError as e:
+            logger.warning(f"Ошибка получения апдейтов: {e}")
+            await asyncio.sleep(1)
+            continue
+
+        for update in updates:
+            dispatch(update.model_dump(mode="json", exclude_none=True))
+            offset = update.update_id + 1
+
+
+def webhook_app(path: str, secret: Optional[str],
+                dispatch: Callable[[Dict[str, Any]], None]) -> web.Application:
+    """Вебхук процесса-приемника: принимает апдейт и сразу отвечает Telegram"""
+
+    async def handle(request: web.Request) -> web.Response:
+        if secret and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret:
+            return web.Response(status=401)
+        dispatch(await request.json())
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(path, handle)
+    return app
+
+
+async def join_processes(processes, timeout: float = 30):
+    """Дождаться завершения воркеров, зависшие - остановить"""
+    for process in processes:
+        await asyncio.to_thread(process.join, timeout)
+        if process.is_alive():
+            logger.warning(f"Воркер {process.name} не завершился, останавливаем")
+            process.terminate()
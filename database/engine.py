@@ -1,20 +1,149 @@
+import logging
 import os
+import time
+from typing import Any, Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+
+logger = logging.getLogger(__name__)
+
+
+DB_URL = os.getenv('DB_URL')
+# Постоянные соединения пула и сколько можно открыть сверх них при нагрузке
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+# Сколько ждать свободное соединение, сек.
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+# Проверять соединение перед выдачей (переживает перезапуск БД)
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+# Через сколько секунд соединение пересоздается, -1 - никогда
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+# Ограничение времени запроса в PostgreSQL, мс. 0 - без ограничения
+DB_STATEMENT_TIMEOUT = int(os.getenv('DB_STATEMENT_TIMEOUT', 0))
+# Логировать каждый SQL-запрос (только для отладки)
+DB_ECHO = os.getenv('DB_ECHO', 'false').lower() == 'true'
+# Запросы дольше этого времени попадают в лог, мс. 0 - не логировать
+DB_SLOW_QUERY_MS = int(os.getenv('DB_SLOW_QUERY_MS', 0))
+# Конфигурация миграций (alembic.ini в корне проекта)
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'alembic.ini')
+
+
+class PoolStats:
+    """Счетчики пула соединений: сколько ждали соединение и сколько медленных запросов"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.slow_queries = 0
+
+    def record_wait(self, seconds: float):
+        self.checkouts += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+
+pool_stats = PoolStats()
 
-from database.models import Base
 
-engine = create_async_engine(os.getenv('DB_URL'), echo=True)
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Пул, который замеряет время ожидания свободного соединения"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_stats.record_wait(time.perf_counter() - start)
+
+
+def engine_options(url: str) -> Dict[str, Any]:
+    url = make_url(url)
+    options: Dict[str, Any] = {"echo": DB_ECHO}
+    # SQLite в памяти работает на одном соединении, пул для нее не настраивается
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return options
+
+    options.update(
+        poolclass=InstrumentedPool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    if DB_STATEMENT_TIMEOUT and url.get_backend_name() == 'postgresql':
+        if url.get_driver_name() == 'asyncpg':
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT}"}
+    return options
+
+
+engine = create_async_engine(DB_URL, **engine_options(DB_URL))
 # engine = create_async_engine(os.getenv('DB_LITE'), echo=True)
 
 session_maker = async_sessionmaker(bind=engine, class_=AsyncSession,
                                    expire_on_commit=False)
 
 
-async def create_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+if DB_SLOW_QUERY_MS:
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _query_started(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _query_finished(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+        if elapsed_ms >= DB_SLOW_QUERY_MS:
+            pool_stats.slow_queries += 1
+            logger.warning(f"Медленный запрос {elapsed_ms:.0f} мс: {' '.join(statement.split())[:500]}")
+
+
+def pool_metrics() -> Dict[str, Any]:
+    """Состояние пула соединений для мониторинга"""
+    pool = engine.pool
+    metrics: Dict[str, Any] = {
+        "checkouts": pool_stats.checkouts,
+        "checkout_wait_seconds_total": round(pool_stats.wait_total, 6),
+        "checkout_wait_seconds_max": round(pool_stats.wait_max, 6),
+        "slow_queries": pool_stats.slow_queries,
+    }
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        metrics.update(
+            size=pool.size(),
+            in_use=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+        )
+    return metrics
+
+
+async def check_db_revision():
+    """
+    Проверить, что схема БД на последней миграции.
+    Схема меняется только командой alembic upgrade head, при запуске бот
+    читает одну строку alembic_version и не трогает таблицы.
+    """
+    # alembic нужен только здесь, не загружаем его при импорте модуля
+    from alembic.config import Config
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
 
+    head = ScriptDirectory.from_config(Config(ALEMBIC_INI)).get_current_head()
+    async with engine.connect() as conn:
+        current = await conn.run_sync(
+            lambda sync_conn: MigrationContext.configure(sync_conn).get_current_revision()
+        )
 
-async def drop_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)
+    if current != head:
+        raise RuntimeError(
+            f"Схема БД на ревизии {current}, ожидается {head}. Выполните: alembic upgrade head "
+            f"(для базы, созданной до перехода на миграции: alembic stamp 0001 && alembic upgrade head)"
+        )
+    logger.info(f"Схема БД на ревизии {current}")
@@ -1,8 +1,7 @@
 import os
-import json
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import BigInteger, Integer, Boolean, String, DateTime, Date, Time, func, ForeignKey, Text, select
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, column_property
+from sqlalchemy import BigInteger, Integer, Boolean, String, DateTime, Date, Time, func, ForeignKey, Text, select, insert, delete, literal, Index, text
 from sqlalchemy import BigInteger, Integer, String, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
@@ -27,7 +26,7 @@ class User(Base):
 
     # Внешний ключ на специализацию и курс
     specialization_id: Mapped[int] = mapped_column(ForeignKey('specializations.id'), nullable=True)
-    course_id: Mapped[int] = mapped_column(ForeignKey('courses.id'), nullable=True)
+    course_id: Mapped[int] = mapped_column(ForeignKey('courses.id'), nullable=True, index=True)
 
     # Связь с специализацией
     specialization: Mapped['Specialization'] = relationship('Specialization', back_populates='users')
@@ -52,6 +51,10 @@ class Specialization(Base):
 # Модель курсов
 class Course(Base):
     __tablename__ = 'courses'
+    __table_args__ = (
+        # Список курсов и постраничный выбор (keyset по name, id)
+        Index('ix_courses_name_id', 'name', 'id'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(200), nullable=False)
@@ -68,10 +71,19 @@ class Course(Base):
         passive_deletes=True
     )
 
+    # Пользователи загружаются только при явном обращении, а не с каждым курсом
     users: Mapped[list['User']] = relationship(
         'User',
-        back_populates='course',
-        lazy='selectin'
+        back_populates='course'
+    )
+    # Число пользователей курса одним подзапросом. Отложенная колонка:
+    # загружается через options(undefer(Course.user_count)) или select(Course.user_count)
+    user_count: Mapped[int] = column_property(
+        select(func.count(User.id))
+        .where(User.course_id == id)
+        .correlate_except(User)
+        .scalar_subquery(),
+        deferred=True
     )
     specialization: Mapped['Specialization'] = relationship(
         'Specialization',
@@ -107,21 +119,40 @@ class Project(Base):
 # Модель рассылки
 class Broadcast(Base):
     __tablename__ = 'broadcasts'
+    __table_args__ = (
+        # Рассылки проекта, доступные пользователям
+        Index('ix_broadcasts_project_active_sent', 'project_id', 'is_active', 'is_sent'),
+        # Отчеты за период
+        Index('ix_broadcasts_created', 'created'),
+        # Список активных рассылок в админке (частичный индекс в PostgreSQL и SQLite)
+        Index('ix_broadcasts_active_created', 'created',
+              postgresql_where=text('is_active = true'), sqlite_where=text('is_active = 1')),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     text: Mapped[str] = mapped_column(Text, nullable=False)
     image_path: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    # file_id изображения в Telegram, чтобы не загружать файл повторно
+    image_file_id: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
     is_sent: Mapped[bool] = mapped_column(Boolean, default=False)
     project_id: Mapped[Optional[int]] = mapped_column(
         ForeignKey("projects.id", ondelete="SET NULL"),
         nullable=True
     )
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    # Чат админа, которому отправляется отчет о доставке
+    admin_chat_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
 
     project: Mapped[Optional["Project"]] = relationship(
         back_populates="broadcasts"
     )
 
+    deliveries: Mapped[List["BroadcastDelivery"]] = relationship(
+        back_populates="broadcast",
+        cascade="all, delete-orphan",
+        passive_deletes=True
+    )
+
     course_associations: Mapped[List["BroadcastCourseAssociation"]] = relationship(
         back_populates="broadcast",
         cascade="all, delete-orphan",
@@ -137,32 +168,71 @@ class Broadcast(Base):
     # course_ids: Mapped[Optional[str]] = mapped_column(String, nullable=True)
 
     async def set_course_ids(self, ids: List[int], session: AsyncSession):
-        """Установить список ID курсов и создать ассоциации"""
-        self.course_ids = json.dumps(ids)
-
-        self.course_associations.clear()
-
-        for course_id in ids:
-            course = await session.get(Course, course_id)
-            if not course:
-                continue
-
-            association = BroadcastCourseAssociation(
-                course_id=course_id,
-                project_id=self.project_id
+        """
+        Установить список ID курсов и создать ассоциации.
+        Несуществующие курсы отбрасываются одним запросом, ассоциации
+        вставляются одним INSERT, независимо от числа курсов.
+        """
+        if self.id is None:
+            # Для ассоциаций нужен id рассылки
+            session.add(self)
+            await session.flush()
+
+        existing = set(await session.scalars(select(Course.id).where(Course.id.in_(ids))))
+        course_ids = [course_id for course_id in dict.fromkeys(ids) if course_id in existing]
+
+        await session.execute(
+            delete(BroadcastCourseAssociation)
+            .where(BroadcastCourseAssociation.broadcast_id == self.id)
+        )
+        if course_ids:
+            await session.execute(
+                insert(BroadcastCourseAssociation),
+                [
+                    {"broadcast_id": self.id, "course_id": course_id, "project_id": self.project_id}
+                    for course_id in course_ids
+                ]
             )
-            self.course_associations.append(association)
+        # Связи изменены в обход ORM, загруженные коллекции устарели
+        session.expire(self, ['course_associations', 'courses'])
+
+    def course_ids_select(self):
+        """Подзапрос ID курсов рассылки для фильтров по получателям"""
+        return (
+            select(BroadcastCourseAssociation.course_id)
+            .where(BroadcastCourseAssociation.broadcast_id == self.id)
+        )
 
     async def get_course_ids(self, session):
-        await session.refresh(self, ['course_associations'])
-        return [ca.course_id for ca in self.course_associations]
+        return list(await session.scalars(self.course_ids_select()))
 
     async def get_recipients(self, session: AsyncSession) -> List[User]:
-        course_ids = await self.get_course_ids(session)
         result = await session.execute(
-            select(User).where(User.course_id.in_(course_ids)))
+            select(User).where(User.course_id.in_(self.course_ids_select())))
         return result.scalars().all()
 
+    async def enqueue_deliveries(self, session: AsyncSession) -> int:
+        """Создать очередь доставки: одна строка на получателя, одним INSERT ... SELECT"""
+        recipients = (
+            select(
+                literal(self.id),
+                User.tg_id,
+                User.course_id,
+                literal(BroadcastDelivery.STATUS_PENDING)
+            )
+            .where(User.course_id.in_(self.course_ids_select()))
+        )
+        await session.execute(
+            insert(BroadcastDelivery).from_select(
+                ['broadcast_id', 'tg_id', 'course_id', 'status'],
+                recipients
+            )
+        )
+        return await session.scalar(
+            select(func.count(BroadcastDelivery.id))
+            .where(BroadcastDelivery.broadcast_id == self.id)
+        )
+
     async def set_image_path(self, image_filename: str):
         """Метод для установки пути к изображению в базе данных."""
         # Путь к изображению относительно директории проекта
@@ -183,7 +253,9 @@ class BroadcastCourseAssociation(Base):
     )
     course_id: Mapped[int] = mapped_column(
         ForeignKey('courses.id', ondelete="CASCADE"),
-        primary_key=True
+        primary_key=True,
+        # Первичный ключ начинается с broadcast_id, для поиска по курсу нужен отдельный индекс
+        index=True
     )
     project_id: Mapped[int] = mapped_column(
         ForeignKey('projects.id', ondelete="CASCADE"),
@@ -193,3 +265,51 @@ class BroadcastCourseAssociation(Base):
     broadcast: Mapped["Broadcast"] = relationship(back_populates="course_associations")
     course: Mapped["Course"] = relationship(back_populates="broadcast_associations")
     project: Mapped["Project"] = relationship(back_populates="broadcast_course_links")
+
+
+# Очередь доставки рассылки: одна строка на получателя
+class BroadcastDelivery(Base):
+    __tablename__ = 'broadcast_deliveries'
+
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+
+    __table_args__ = (
+        # Выборка очереди и подсчет прогресса рассылки
+        Index('ix_broadcast_deliveries_broadcast_status', 'broadcast_id', 'status'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    broadcast_id: Mapped[int] = mapped_column(
+        ForeignKey('broadcasts.id', ondelete="CASCADE"),
+        nullable=False
+    )
+    tg_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    course_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey('courses.id', ondelete="SET NULL"),
+        nullable=True
+    )
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default=STATUS_PENDING)
+
+    broadcast: Mapped["Broadcast"] = relationship(back_populates="deliveries")
+
+
+# Состояния FSM пользователей (хранилище FSM_STORAGE=sql)
+class FSMRecord(Base):
+    __tablename__ = 'fsm_states'
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    state: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    data: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # После этого момента запись считается брошенной и удаляется
+    expires_at: Mapped[DateTime] = mapped_column(DateTime, nullable=False, index=True)
+
+
+# Админы бота из группы админов (команда /admin), общие для всех процессов
+class BotAdmin(Base):
+    __tablename__ = 'bot_admins'
+
+    tg_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
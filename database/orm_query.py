@@ -1,5 +1,5 @@
 from aiogram.types import message, FSInputFile, Message
-from sqlalchemy import select, update, insert
+from sqlalchemy import select, update, insert, func
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
@@ -12,3 +12,57 @@ from datetime import datetime
 async def get_all_projects(session: AsyncSession):
     result = await session.execute(select(Project))
     return result.scalars().all()
+
+
+def aggregate_strings(session: AsyncSession, column, separator: str = ', '):
+    """Склеивание строк в группе: string_agg в PostgreSQL, group_concat в SQLite"""
+    if session.get_bind().dialect.name == 'postgresql':
+        return func.string_agg(column, separator)
+    return func.group_concat(column, separator)
+
+
+def broadcasts_summary_query(session: AsyncSession, separator: str = ', ', broadcast_ids=None):
+    """
+    Рассылки с проектом, списком курсов и числом получателей одним запросом.
+    Курсы и получатели считаются в сгруппированных подзапросах по BroadcastCourseAssociation.
+    :param broadcast_ids: Запрос id нужных рассылок (например, страница с ORDER BY/LIMIT) -
+                          тогда группируются только их строки, а не все рассылки
+    """
+    courses = (
+        select(
+            BroadcastCourseAssociation.broadcast_id,
+            aggregate_strings(session, Course.name, separator).label("courses")
+        )
+        .join(Course, Course.id == BroadcastCourseAssociation.course_id)
+        .group_by(BroadcastCourseAssociation.broadcast_id)
+    )
+    recipients = (
+        select(
+            BroadcastCourseAssociation.broadcast_id,
+            func.count(User.id).label("recipients")
+        )
+        .join(User, User.course_id == BroadcastCourseAssociation.course_id)
+        .group_by(BroadcastCourseAssociation.broadcast_id)
+    )
+    if broadcast_ids is not None:
+        courses = courses.where(BroadcastCourseAssociation.broadcast_id.in_(broadcast_ids))
+        recipients = recipients.where(BroadcastCourseAssociation.broadcast_id.in_(broadcast_ids))
+    courses = courses.subquery()
+    recipients = recipients.subquery()
+
+    query = (
+        select(
+            Broadcast.id,
+            Broadcast.created.label("date"),
+            Broadcast.text.label("message"),
+            Project.title.label("project"),
+            courses.c.courses,
+            func.coalesce(recipients.c.recipients, 0).label("recipients")
+        )
+        .outerjoin(Project, Broadcast.project_id == Project.id)
+        .outerjoin(courses, courses.c.broadcast_id == Broadcast.id)
+        .outerjoin(recipients, recipients.c.broadcast_id == Broadcast.id)
+    )
+    if broadcast_ids is not None:
+        query = query.where(Broadcast.id.in_(broadcast_ids))
+    return query
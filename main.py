@@ -1,18 +1,33 @@
 import os
 import asyncio
+import multiprocessing
+import time
 from typing import Optional
 
+# Время старта процесса, для замера длительности запуска
+STARTED_AT = time.perf_counter()
+
 from aiogram import Bot, Dispatcher, types
 from aiogram.filters import Command
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 from dotenv import load_dotenv
 load_dotenv()
 
 import logging
+from app.admins import admin_registry
 from app.bot_cmds_list import bot_cmds_list
-from database.engine import create_db, drop_db, session_maker
-from aiogram.fsm.storage.memory import MemoryStorage
+from app.broadcaster import broadcast_dispatcher
+from app.catalog import catalog_cache
+from app.fsm_storage import FSM_STORAGE, create_storage
+from app.jobs import job_runner
+from app.metrics import METRICS_PORT, setup_metrics, start_metrics_server
+from app.profiler import ProfilerMiddleware, profiler
+from app.workers import BOT_WORKERS, consume_updates, join_processes, poll_updates, webhook_app, worker_for
+from database.engine import check_db_revision, engine, session_maker
 from aiogram.fsm.state import default_state, State, StatesGroup
-from middlewares.db import DataBaseSession
+from middlewares.concurrency import ConcurrencyLimit
+from middlewares.db import DataBaseSession, setup_db_session
 from app.handlers.start import start_router
 from app.handlers.admin import admin_router
 from app.handlers.user_group import user_group_router
@@ -30,10 +45,26 @@ logging.basicConfig(level=logging.INFO)
 
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 
+# Режим получения апдейтов: polling или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+# Публичный адрес бота для Telegram, например https://bot.example.com
+# Без него сервер запускается без регистрации вебхука (локальная отладка)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+# Telegram передает его в заголовке X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBAPP_HOST = os.getenv('WEBAPP_HOST', '0.0.0.0')
+WEBAPP_PORT = int(os.getenv('WEBAPP_PORT', 8080))
+# Сколько апдейтов обрабатывается одновременно
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', 50))
+
 bot = Bot(BOT_TOKEN)
-bot.admins_list = []
 
-dp = Dispatcher(storage=MemoryStorage())
+# Порт /metrics этого процесса (у воркеров METRICS_PORT + номер воркера)
+metrics_port = METRICS_PORT
+metrics_runner: Optional[web.AppRunner] = None
+
+dp = Dispatcher(storage=create_storage(session_maker))
 
 dp.include_router(user_group_router)
 dp.include_router(profile_router)
@@ -74,27 +105,187 @@ async def send_to_chat(text: str, chat_id: Optional[int] = None):
         logging.error(f"Ошибка отправки в чат {target_chat_id}: {e}")
 
 
-async def on_startup(bot):
-
-    """Действия при перезапуске бота"""
+async def notify_restart():
     if CHAT_ID is not None:
         await send_to_chat(text="🔄 Бот был перезапущен! Для входа в админ-панель "
                                 "введите команду /admin в этой группе, а затем в боте.")
     else:
         logging.warning("CHAT_ID не установлен. Уведомление о перезапуске не отправлено.")
 
-    run_param = False
-    if run_param:
-        await drop_db()
-    await create_db()
-    logging.info("Бот успешно запущен.")
+
+async def on_startup(bot):
+
+    """Действия при перезапуске бота"""
+    await notify_restart()
+    await check_db_revision()
+
+    await on_worker_startup(bot)
+    logging.info(f"Бот успешно запущен за {time.perf_counter() - STARTED_AT:.2f} с.")
+
+
+async def on_worker_startup(bot):
+    """Фоновые службы процесса, который обрабатывает апдейты"""
+    admin_registry.start(session_maker)
+    # Фоновая доставка рассылок (продолжает незавершенные после перезапуска)
+    broadcast_dispatcher.start(bot, session_maker)
+    # Очередь тяжелых задач админа (отчеты, выгрузки)
+    job_runner.start(bot, session_maker)
+
+    # Семплирующий профайлер (PROFILE_SAMPLE_RATE или команда /profile)
+    profiler.start()
+
+    global metrics_runner
+    metrics_runner = await start_metrics_server(metrics_port)
+
+
+async def on_shutdown(bot):
+    """Действия при остановке бота"""
+    await broadcast_dispatcher.stop()
+    await job_runner.stop()
+    profiler.stop()
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+
+
+async def set_webhook(bot):
+    if not WEBHOOK_URL:
+        logging.warning("WEBHOOK_URL не установлен, вебхук в Telegram не зарегистрирован.")
+        return
+    await bot.set_webhook(
+        url=f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+        drop_pending_updates=True
+    )
+
+
+async def run_webhook():
+    """Прием апдейтов через aiohttp-сервер"""
+    dp.startup.register(set_webhook)
+
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET
+    ).register(app, path=WEBHOOK_PATH)
+    # Запуск и остановка диспетчера вместе с приложением
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT).start()
+    logging.info(f"Вебхук слушает {WEBAPP_HOST}:{WEBAPP_PORT}{WEBHOOK_PATH}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def setup_middlewares():
+    dp.update.outer_middleware(ConcurrencyLimit(UPDATE_CONCURRENCY))
+    setup_metrics(dp, bot)
+    dp.update.outer_middleware(ProfilerMiddleware())
+    # Группа админов работает без БД: список админов хранит admin_registry
+    setup_db_session(dp, DataBaseSession(session_pool=session_maker), exclude=[user_group_router])
+
+
+def run_worker(index: int, updates_queue, control_queue, catalog_version):
+    """Точка входа процесса-воркера (BOT_WORKERS > 0)"""
+    try:
+        asyncio.run(worker_main(index, updates_queue, control_queue, catalog_version))
+    except KeyboardInterrupt:
+        pass
+
+
+async def worker_main(index: int, updates_queue, control_queue, catalog_version):
+    global metrics_port
+    if METRICS_PORT:
+        metrics_port = METRICS_PORT + index
+    # Рассылки отправляет только первый воркер, остальные передают ему команды
+    broadcast_dispatcher.connect(control_queue, host=index == 0)
+    # Изменение справочников в любом воркере сбрасывает кэш во всех
+    catalog_cache.connect(catalog_version)
+    dp.startup.register(on_worker_startup)
+    dp.shutdown.register(on_shutdown)
+    setup_middlewares()
+
+    await dp.emit_startup(bot=bot)
+    logging.info(f"Воркер {index} запущен.")
+    try:
+        await consume_updates(updates_queue, lambda update: dp.feed_raw_update(bot, update))
+    finally:
+        await dp.emit_shutdown(bot=bot)
+        await bot.session.close()
+        # Иначе соединения пула не дают процессу завершиться
+        await engine.dispose()
+
+
+async def run_ingress():
+    """
+    Процесс-приемник: получает апдейты (polling или webhook) и раздает их
+    воркерам по chat_id, поэтому апдейты одного чата обрабатываются по порядку.
+    """
+    if FSM_STORAGE == 'memory':
+        raise RuntimeError("Для BOT_WORKERS нужно общее хранилище состояний: FSM_STORAGE=sql или redis")
+
+    await notify_restart()
+    await check_db_revision()
+
+    # spawn одинаково работает на Linux и Windows и не копирует в воркеры соединения с БД
+    context = multiprocessing.get_context('spawn')
+    control_queue = context.Queue()
+    catalog_version = context.Value('i', 0)
+    queues = [context.Queue() for _ in range(BOT_WORKERS)]
+    processes = [
+        context.Process(target=run_worker, args=(index, queues[index], control_queue, catalog_version), name=f"worker-{index}")
+        for index in range(BOT_WORKERS)
+    ]
+    for process in processes:
+        process.start()
+
+    def dispatch(update: dict):
+        queues[worker_for(update, BOT_WORKERS)].put(update)
+
+    try:
+        if BOT_MODE == 'webhook':
+            runner = web.AppRunner(webhook_app(WEBHOOK_PATH, WEBHOOK_SECRET, dispatch))
+            await runner.setup()
+            await web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT).start()
+            await set_webhook(bot)
+            logging.info(f"Вебхук слушает {WEBAPP_HOST}:{WEBAPP_PORT}{WEBHOOK_PATH}, воркеров: {BOT_WORKERS}")
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await runner.cleanup()
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            logging.info(f"Polling запущен, воркеров: {BOT_WORKERS}")
+            await poll_updates(bot, dp.resolve_used_update_types(), dispatch)
+    finally:
+        # None - сигнал воркеру завершиться после уже принятых апдейтов
+        for updates_queue in queues:
+            updates_queue.put(None)
+        await join_processes(processes)
+        await bot.session.close()
+
 
 async def main():
-    dp.startup.register(on_startup)
-    dp.update.middleware(DataBaseSession(session_pool=session_maker))
-    await bot.delete_webhook(drop_pending_updates=True)
     await bot.set_my_commands(commands=bot_cmds_list, scope=types.BotCommandScopeAllPrivateChats())
-    await dp.start_polling(bot)
+
+    if BOT_WORKERS > 0:
+        await run_ingress()
+        return
+
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    setup_middlewares()
+
+    if BOT_MODE == 'webhook':
+        await run_webhook()
+    else:
+        await bot.delete_webhook(drop_pending_updates=True)
+        await dp.start_polling(bot)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,21 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+
+class ConcurrencyLimit(BaseMiddleware):
+    """Ограничивает число апдейтов, которые обрабатываются одновременно"""
+
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit)
+
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        async with self.semaphore:
+            return await handler(event, data)
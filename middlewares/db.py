@@ -1,7 +1,45 @@
-from typing import Any, Awaitable, Callable, Dict
-from aiogram import BaseMiddleware
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+from aiogram import BaseMiddleware, Router
 from aiogram.types import TelegramObject
-from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+
+class DBUsage:
+    """Сколько обработанных апдейтов действительно обращались к БД"""
+
+    def __init__(self):
+        self.updates = 0
+        self.used = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"updates": self.updates, "used": self.used}
+
+
+db_usage = DBUsage()
+
+
+class LazySession:
+    """
+    Заместитель AsyncSession: настоящая сессия создается при первом обращении
+    к любому ее атрибуту, поэтому обработчики без запросов к БД ее не открывают.
+    """
+
+    def __init__(self, session_pool: async_sessionmaker):
+        self._session_pool = session_pool
+        self._session: Optional[AsyncSession] = None
+
+    @property
+    def used(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name: str) -> Any:
+        if self._session is None:
+            self._session = self._session_pool()
+        return getattr(self._session, name)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
 
 
 class DataBaseSession(BaseMiddleware):
@@ -15,7 +53,33 @@ class DataBaseSession(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any],
     ) -> Any:
-        async with self.session_pool() as session:
-            data['session'] = session
+        session = LazySession(self.session_pool)
+        data['session'] = session
+        try:
             return await handler(event, data)
+        finally:
+            db_usage.updates += 1
+            if session.used:
+                db_usage.used += 1
+            await session.close()
+
 
+def setup_db_session(router: Router, middleware: DataBaseSession, exclude: Iterable[Router] = ()):
+    """
+    Подключить сессию к обработчикам вложенных роутеров.
+    Middleware срабатывает только когда обработчик найден; роутеры из exclude
+    (обработчики без БД) сессию не получают вовсе.
+    На сам router middleware не вешается: aiogram применяет middleware роутера
+    ко всем вложенным, и исключить их было бы нельзя.
+    """
+    exclude = set(exclude)
+    wrapped = set()
+    for sub_router in router.chain_tail:
+        if sub_router is router or sub_router in exclude:
+            continue
+        wrapped.add(sub_router)
+        if sub_router.parent_router in wrapped:
+            # Уже получает middleware от родителя
+            continue
+        for observer in sub_router.observers.values():
+            observer.middleware(middleware)
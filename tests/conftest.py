@@ -0,0 +1,141 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+# Тесты работают на отдельной SQLite-базе: адрес задается до импорта database.engine
+DB_PATH = os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ["DB_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+# Бот без сети: токен нужен только для импорта main
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, insert, select  # noqa: E402
+
+from database.engine import ALEMBIC_INI, engine, session_maker  # noqa: E402
+from database.models import Broadcast, BroadcastCourseAssociation, Course, Project, Specialization, User  # noqa: E402
+
+
+COURSES = 10
+USERS = 500
+
+
+@pytest.fixture(scope="session")
+def database():
+    """Схема создается миграциями, как на рабочей базе"""
+    from alembic import command
+    from alembic.config import Config
+
+    command.upgrade(Config(ALEMBIC_INI), "head")
+    run(seed_catalog())
+    yield
+    os.unlink(DB_PATH)
+
+
+def run(coro):
+    """Выполнить корутину в новом event loop; соединения пула привязаны к нему и закрываются"""
+    async def main():
+        try:
+            return await coro
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+async def seed_catalog():
+    async with session_maker() as session:
+        await session.execute(insert(Specialization), [{"name": "Специализация"}])
+        await session.execute(insert(Project), [{"title": "Проект"}])
+        await session.execute(insert(Course), [
+            {"name": f"Курс {i}", "specialization_id": 1} for i in range(COURSES)
+        ])
+        await session.execute(insert(User), [
+            {"tg_id": 1000 + i, "specialization_id": 1, "course_id": i % COURSES + 1}
+            for i in range(USERS)
+        ])
+        await session.commit()
+
+
+async def seed_users(count: int):
+    """Добавить count пользователей, распределенных по курсам каталога"""
+    async with session_maker() as session:
+        first_tg_id = (await session.scalar(select(func.max(User.tg_id)))) or 1000
+        await session.execute(insert(User), [
+            {"tg_id": first_tg_id + i + 1, "specialization_id": 1, "course_id": i % COURSES + 1}
+            for i in range(count)
+        ])
+        await session.commit()
+
+
+async def seed_courses(count: int, duplicates: int = 3) -> list:
+    """Добавить count курсов, у каждых duplicates подряд одинаковое название; вернуть их id"""
+    async with session_maker() as session:
+        first_id = (await session.scalar(select(func.max(Course.id)))) or 0
+        await session.execute(insert(Course), [
+            {"name": f"Поток {i // duplicates:05d}", "specialization_id": 1}
+            for i in range(count)
+        ])
+        await session.commit()
+    return list(range(first_id + 1, first_id + count + 1))
+
+
+async def seed_broadcasts(count: int):
+    """Добавить count отправленных рассылок, у каждой по два курса"""
+    async with session_maker() as session:
+        first_id = (await session.scalar(select(func.max(Broadcast.id)))) or 0
+        start = datetime(2025, 1, 1)
+        await session.execute(insert(Broadcast), [
+            {
+                "text": f"Рассылка {first_id + i + 1}",
+                "project_id": 1 if i % 2 else None,
+                "is_sent": True,
+                "is_active": i % 3 != 0,
+                "created": start + timedelta(hours=first_id + i),
+            }
+            for i in range(count)
+        ])
+        await session.execute(insert(BroadcastCourseAssociation), [
+            {"broadcast_id": broadcast_id, "course_id": course_id}
+            for broadcast_id in range(first_id + 1, first_id + count + 1)
+            for course_id in (broadcast_id % COURSES + 1, (broadcast_id + 1) % COURSES + 1)
+        ])
+        await session.commit()
+
+
+async def create_mailing(course_ids, text: str = "Рассылка") -> int:
+    """Рассылка с очередью доставки всем пользователям курсов, как после подтверждения админом"""
+    async with session_maker() as session:
+        broadcast = Broadcast(text=text, is_sent=False, is_active=True)
+        session.add(broadcast)
+        await broadcast.set_course_ids(course_ids, session)
+        await broadcast.enqueue_deliveries(session)
+        await session.commit()
+        return broadcast.id
+
+
+class FakeBot:
+    """Bot без сети: отправка занимает delay секунд, получатели запоминаются"""
+
+    def __init__(self, delay: float = 0.005):
+        self.delay = delay
+        self.attempted = []
+        self.delivered = []
+        # (chat_id, "photo" | "text", время доставки)
+        self.messages = []
+
+    async def _send(self, chat_id, kind: str):
+        self.attempted.append(chat_id)
+        await asyncio.sleep(self.delay)
+        self.delivered.append(chat_id)
+        self.messages.append((chat_id, kind, time.monotonic()))
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._send(chat_id, "text")
+
+    async def send_photo(self, chat_id, photo, caption=None, **kwargs):
+        await self._send(chat_id, "photo")
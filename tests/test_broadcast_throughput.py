@@ -0,0 +1,43 @@
+import time
+
+from conftest import FakeBot, run
+from app.broadcaster import Broadcaster, MessageSender
+
+
+RECIPIENTS = 3000
+RATE = 1000
+
+
+async def broadcast_throughput(text: str, photo: str = None,
+                               recipients: int = RECIPIENTS, **kwargs) -> float:
+    bot = FakeBot()
+    sender = MessageSender(bot, text, photo=photo, file_id=photo)
+    broadcaster = Broadcaster(rate=RATE, **kwargs)
+    started = time.monotonic()
+    await broadcaster.run([(tg_id, 1) for tg_id in range(recipients)], send=sender.parts)
+    elapsed = time.monotonic() - started
+    assert broadcaster.success_count == recipients
+    return len(bot.messages) / elapsed
+
+
+def test_text_broadcast_throughput(record_property):
+    throughput = run(broadcast_throughput("Текст рассылки"))
+    record_property("msgs_per_sec", round(throughput))
+    print(f"\nТекстовая рассылка: {throughput:.0f} сообщ./с при лимите {RATE}")
+
+    # Движок упирается в лимит частоты, а не в воркеры
+    assert throughput >= RATE * 0.8
+
+
+def test_photo_with_long_text_throughput(record_property):
+    # Между фото и текстом воркер выдерживает интервал на один чат,
+    # поэтому скорость ограничена числом воркеров, а не общим лимитом
+    workers, interval = 8, 0.05
+    throughput = run(broadcast_throughput("x" * 2000, photo="file-id", recipients=400,
+                                          workers=workers, per_chat_interval=interval))
+    record_property("msgs_per_sec", round(throughput))
+    print(f"\nФото с длинным текстом: {throughput:.0f} сообщ./с, "
+          f"{workers} воркеров, интервал {interval} с")
+
+    # Каждый воркер отправляет 2 сообщения за interval секунд
+    assert throughput >= 2 * workers / interval * 0.5
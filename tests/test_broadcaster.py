@@ -0,0 +1,143 @@
+import asyncio
+import gc
+from collections import Counter
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+from sqlalchemy import delete, func, select
+
+from conftest import FakeBot, create_mailing, run
+from app.broadcaster import BroadcastDispatcher, Broadcaster, MessageSender
+from database.engine import session_maker
+from database.models import Broadcast, BroadcastCourseAssociation, BroadcastDelivery
+
+
+async def statuses(broadcast_id: int):
+    async with session_maker() as session:
+        rows = await session.execute(
+            select(BroadcastDelivery.status, func.count())
+            .where(BroadcastDelivery.broadcast_id == broadcast_id)
+            .group_by(BroadcastDelivery.status)
+        )
+        return dict(rows.all())
+
+
+async def failed_recipients(broadcast_id: int):
+    async with session_maker() as session:
+        return set(await session.scalars(
+            select(BroadcastDelivery.tg_id)
+            .where(BroadcastDelivery.broadcast_id == broadcast_id,
+                   BroadcastDelivery.status == BroadcastDelivery.STATUS_FAILED)
+        ))
+
+
+async def deliver_with_restarts(stop_timeout: float):
+    """Рассылка 200 получателям с остановками бота посреди пачки"""
+    broadcast_id = await create_mailing([1, 2, 3, 4])
+    bot = FakeBot()
+    dispatcher = BroadcastDispatcher(batch_size=50, rate=1000)
+    for _ in range(500):
+        dispatcher.start(bot, session_maker)
+        await asyncio.sleep(0.05)
+        await dispatcher.stop(timeout=stop_timeout)
+        if BroadcastDelivery.STATUS_PENDING not in await statuses(broadcast_id):
+            break
+    return bot, await statuses(broadcast_id), await failed_recipients(broadcast_id)
+
+
+def test_restart_resumes_without_duplicates_or_lost_recipients(database):
+    bot, counts, _ = run(deliver_with_restarts(stop_timeout=30))
+
+    assert max(Counter(bot.delivered).values()) == 1
+    assert counts == {BroadcastDelivery.STATUS_SENT: 200}
+
+
+# Принудительная остановка прерывает запросы к БД, соединения закрываются сборщиком мусора
+@pytest.mark.filterwarnings("ignore::sqlalchemy.exc.SAWarning")
+def test_forced_stop_fails_only_recipients_handed_to_telegram(database):
+    bot, counts, failed = run(deliver_with_restarts(stop_timeout=0))
+    gc.collect()
+
+    assert max(Counter(bot.attempted).values()) == 1
+    assert sum(counts.values()) == 200
+    assert BroadcastDelivery.STATUS_PENDING not in counts
+    assert BroadcastDelivery.STATUS_SENDING not in counts
+    # Ошибкой помечены только прерванные посреди отправки
+    assert failed <= set(bot.attempted) - set(bot.delivered)
+
+
+async def process_deleted_broadcast():
+    broadcast_id = await create_mailing([5])
+    async with session_maker() as session:
+        # Очередь доставки остается: без внешних ключей SQLite не удаляет ее каскадно
+        await session.execute(delete(BroadcastCourseAssociation)
+                              .where(BroadcastCourseAssociation.broadcast_id == broadcast_id))
+        await session.execute(delete(Broadcast).where(Broadcast.id == broadcast_id))
+        await session.commit()
+
+    dispatcher = BroadcastDispatcher()
+    dispatcher.start(FakeBot(), session_maker)
+    await dispatcher.stop()
+    await dispatcher._process(broadcast_id)
+    return await statuses(broadcast_id)
+
+
+def test_deleted_broadcast_queue_is_dropped(database):
+    assert run(process_deleted_broadcast()) == {}
+
+
+async def cancel_mailing():
+    broadcast_id = await create_mailing([6, 7])
+    dispatcher = BroadcastDispatcher(batch_size=20, rate=50)
+    dispatcher.start(FakeBot(), session_maker)
+    await asyncio.sleep(0.3)
+    assert dispatcher.cancel(broadcast_id)
+    await asyncio.sleep(0.3)
+    # Повторный проход диспетчера не должен возобновить отмененную рассылку
+    await dispatcher._drain()
+    await dispatcher.stop()
+
+    async with session_maker() as session:
+        broadcast = await session.get(Broadcast, broadcast_id)
+        return broadcast.is_sent, await statuses(broadcast_id)
+
+
+def test_cancelled_broadcast_is_not_marked_sent(database):
+    is_sent, counts = run(cancel_mailing())
+
+    assert is_sent is False
+    assert counts[BroadcastDelivery.STATUS_CANCELLED] > 0
+    assert BroadcastDelivery.STATUS_PENDING not in counts
+
+
+class FloodOnTextBot(FakeBot):
+    """Первая отправка текста упирается в flood control"""
+
+    def __init__(self):
+        super().__init__(delay=0)
+        self.flooded = False
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if not self.flooded:
+            self.flooded = True
+            raise TelegramRetryAfter(method=SendMessage(chat_id=chat_id, text=text),
+                                     message="Too Many Requests", retry_after=0)
+        await super().send_message(chat_id, text, **kwargs)
+
+
+async def send_photo_with_long_text():
+    bot = FloodOnTextBot()
+    sender = MessageSender(bot, "x" * 2000, photo="file-id", file_id="file-id")
+    broadcaster = Broadcaster(workers=1, rate=100, per_chat_interval=0.2)
+    await broadcaster.run([(42, 1)], send=sender.parts)
+    return broadcaster, bot.messages
+
+
+def test_photo_is_not_resent_when_text_hits_flood_control():
+    broadcaster, messages = run(send_photo_with_long_text())
+
+    assert broadcaster.success_count == 1
+    assert [kind for _, kind, _ in messages] == ["photo", "text"]
+    # Между фото и текстом соблюдается лимит на один чат
+    assert messages[1][2] - messages[0][2] >= 0.2
@@ -0,0 +1,70 @@
+import statistics
+import time
+
+from sqlalchemy import select
+
+from conftest import run, seed_courses
+from app.keyboards.inline import bc_courses_keyboard
+from database.engine import session_maker
+from database.models import Course
+
+
+COURSES = 10_000
+PER_PAGE = 6
+# Страниц в начале и в конце выборки, по которым сравнивается задержка
+SAMPLE = 30
+
+
+def page_cursor(builder, direction: str):
+    """Курсор из кнопки навигации "n..." / "p..." или None, если кнопки нет"""
+    for row in builder.export():
+        for button in row:
+            if button.callback_data and button.callback_data.startswith(f"bcpage_{direction}"):
+                return button.callback_data.split("_", 2)[1]
+    return None
+
+
+def page_ids(builder):
+    return [int(button.callback_data.removeprefix("bccourse_"))
+            for row in builder.export() for button in row
+            if button.callback_data and button.callback_data.startswith("bccourse_")]
+
+
+async def walk_pages(direction: str, cursor: str = None):
+    """Пролистать все страницы; вернуть id курсов, задержку каждой страницы и последний курсор"""
+    ids, timings = [], []
+    async with session_maker() as session:
+        while True:
+            started = time.perf_counter()
+            builder = await bc_courses_keyboard(session, cursor=cursor, per_page=PER_PAGE)
+            timings.append(time.perf_counter() - started)
+            page = page_ids(builder)
+            ids.extend(page if direction == "n" else reversed(page))
+            next_cursor = page_cursor(builder, direction)
+            if next_cursor is None:
+                return ids, timings, cursor
+            cursor = next_cursor
+
+
+async def expected_order():
+    async with session_maker() as session:
+        return list(await session.scalars(select(Course.id).order_by(Course.name, Course.id)))
+
+
+def test_keyset_pages_cover_duplicate_names_with_flat_latency(database):
+    run(seed_courses(COURSES))
+    order = run(expected_order())
+
+    ids, timings, last_cursor = run(walk_pages("n"))
+    # Курсы с одинаковым названием не теряются и не повторяются на соседних страницах
+    assert ids == order
+
+    first = statistics.median(timings[:SAMPLE])
+    last = statistics.median(timings[-SAMPLE:])
+    print(f"\n{len(timings)} страниц: первые {first * 1000:.2f} мс, последние {last * 1000:.2f} мс")
+    # Keyset-пагинация не зависит от номера страницы (OFFSET рос бы линейно)
+    assert last < first * 3 + 0.002
+
+    # Обратно от последней страницы к первой
+    back_ids, _, _ = run(walk_pages("p", cursor=last_cursor))
+    assert back_ids == order[::-1]
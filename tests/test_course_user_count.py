@@ -0,0 +1,60 @@
+import time
+import tracemalloc
+
+from sqlalchemy import func, inspect, select
+
+from conftest import run, seed_users
+from app.handlers.admin_stats import get_course_stats
+from app.metrics import count_queries
+from database.engine import session_maker
+from database.models import Course, User
+
+
+USERS = 50_000
+
+
+async def load_courses():
+    """Загрузить все курсы; вернуть (курсы, задержку, пик памяти)"""
+    async with session_maker() as session:
+        tracemalloc.start()
+        started = time.perf_counter()
+        courses = list(await session.scalars(select(Course)))
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return courses, elapsed, peak
+
+
+async def course_stats():
+    async with session_maker() as session:
+        with count_queries() as queries:
+            started = time.perf_counter()
+            stats = await get_course_stats(session)
+            elapsed = time.perf_counter() - started
+        total = await session.scalar(select(func.count(User.id)).where(User.course_id.is_not(None)))
+        return stats, elapsed, total, queries.db_queries
+
+
+def test_courses_load_without_users(database):
+    # Первый запрос компилирует выражения и прогревает пул соединений
+    run(load_courses())
+    _, before_elapsed, before_peak = run(load_courses())
+    run(seed_users(USERS))
+    courses, elapsed, peak = run(load_courses())
+
+    print(f"\nЗагрузка {len(courses)} курсов: {before_elapsed * 1000:.1f} -> {elapsed * 1000:.1f} мс, "
+          f"пик памяти {before_peak // 1024} -> {peak // 1024} КиБ")
+    # Пользователи и их число не загружаются вместе с курсами
+    assert all({"users", "user_count"} <= inspect(course).unloaded for course in courses)
+    # Ни память, ни время загрузки курсов не растут с числом пользователей
+    assert peak < before_peak * 1.5 + 256 * 1024
+    assert elapsed < before_elapsed * 3 + 0.05
+
+
+def test_course_stats_counts_users_with_one_query(database):
+    stats, elapsed, total, queries = run(course_stats())
+
+    print(f"\nСтатистика по {len(stats)} курсам: {elapsed * 1000:.1f} мс")
+    assert queries == 1
+    assert sum(count for _, count in stats) == total >= USERS
+    assert elapsed < 1
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+from sqlalchemy import func, select, update
+
+from conftest import run
+from app import fsm_storage
+from app.fsm_states import StartState
+from app.fsm_storage import SQLStorage, create_storage
+from database.engine import session_maker
+from database.models import FSMRecord
+
+
+BOT_ID = 1
+
+
+def storage_key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=BOT_ID, chat_id=user_id, user_id=user_id)
+
+
+async def expire(storage: SQLStorage, key: StorageKey):
+    """Сдвинуть срок жизни записи в прошлое, как будто ttl уже прошел"""
+    async with session_maker() as session:
+        await session.execute(
+            update(FSMRecord)
+            .where(FSMRecord.key == storage.key_builder.build(key))
+            .values(expires_at=datetime.now() - timedelta(seconds=1))
+        )
+        await session.commit()
+
+
+async def fsm_rows() -> int:
+    async with session_maker() as session:
+        return await session.scalar(select(func.count()).select_from(FSMRecord))
+
+
+async def expired_state_is_not_returned():
+    storage = SQLStorage(session_maker, ttl=60)
+    key = storage_key(1)
+    await storage.set_state(key, StartState.waiting_for_course)
+    await storage.set_data(key, {"page": 2})
+    before = await storage.get_state(key), await storage.get_data(key)
+
+    await expire(storage, key)
+    return before, (await storage.get_state(key), await storage.get_data(key))
+
+
+def test_sql_storage_forgets_expired_state(database):
+    before, after = run(expired_state_is_not_returned())
+
+    assert before == (StartState.waiting_for_course.state, {"page": 2})
+    assert after == (None, {})
+
+
+async def upsert_after_expiry():
+    storage = SQLStorage(session_maker, ttl=60)
+    key = storage_key(2)
+    await storage.set_state(key, StartState.waiting_for_specialization)
+    await storage.set_data(key, {"old": True})
+    await expire(storage, key)
+
+    # Запись еще не удалена: новые данные не должны оживить старое состояние
+    await storage.set_data(key, {"new": True})
+    return await storage.get_state(key), await storage.get_data(key)
+
+
+def test_sql_storage_upsert_resets_expired_row(database):
+    assert run(upsert_after_expiry()) == (None, {"new": True})
+
+
+async def cleanup_rows():
+    storage = SQLStorage(session_maker, ttl=60)
+    live, expired, cleared = storage_key(3), storage_key(4), storage_key(5)
+    await storage.set_state(live, StartState.waiting_for_course)
+    await storage.set_data(expired, {"page": 1})
+    await expire(storage, expired)
+    # После state.clear() остается пустая строка
+    await storage.set_state(cleared, StartState.waiting_for_course)
+    await storage.set_state(cleared, None)
+    await storage.set_data(cleared, {})
+
+    rows_before = await fsm_rows()
+    removed = await storage.cleanup()
+    return rows_before - await fsm_rows(), removed, await storage.get_state(live)
+
+
+def test_sql_storage_cleanup_removes_expired_and_empty_rows(database):
+    deleted, removed, live_state = run(cleanup_rows())
+
+    assert deleted == removed >= 2
+    assert live_state == StartState.waiting_for_course.state
+
+
+async def redis_round_trip(storage):
+    key = storage_key(6)
+    await storage.set_state(key, StartState.waiting_for_course)
+    await storage.set_data(key, {"course_cursor": "n5"})
+    ttl = await storage.redis.ttl(storage.key_builder.build(key, "state"))
+    result = await storage.get_state(key), await storage.get_data(key), ttl
+    await storage.close()
+    return result
+
+
+def test_redis_storage_keeps_state_with_ttl(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    from aiogram.fsm.storage.redis import RedisStorage
+
+    monkeypatch.setattr(fsm_storage, "FSM_STORAGE", "redis")
+    storage = create_storage(session_maker)
+    assert isinstance(storage, RedisStorage)
+    storage.redis = fakeredis.FakeAsyncRedis()
+
+    state, data, ttl = run(redis_round_trip(storage))
+
+    assert state == StartState.waiting_for_course.state
+    assert data == {"course_cursor": "n5"}
+    assert 0 < ttl <= fsm_storage.FSM_STATE_TTL
@@ -0,0 +1,129 @@
+import itertools
+from datetime import datetime
+
+import pytest
+from aiogram.client.session.base import BaseSession
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.methods import AnswerCallbackQuery, TelegramMethod
+from aiogram.types import CallbackQuery, Chat, Message, Update
+from aiogram.types import User as TelegramUser
+from sqlalchemy import func, select
+
+from conftest import run, seed_broadcasts
+from app.catalog import broadcast_cache, catalog_cache
+from app.jobs import JobRunner
+from app.metrics import count_queries
+from database.engine import session_maker
+from database.models import User
+from middlewares.db import DataBaseSession, setup_db_session
+import main
+
+
+# Пользователь из seed_catalog, записан на курс 1
+TG_ID = 1000
+
+# (текст сообщения или callback_data, допустимое число SQL-запросов за апдейт)
+MESSAGE_BUDGETS = [
+    ("/start", 1),
+    ("Мой курс", 3),
+    ("Проекты", 1),
+]
+CALLBACK_BUDGETS = [
+    ("view_project_1", 2),
+    ("available_to_me_project_1", 5),
+    ("view_course_events_1", 3),
+    ("next_course_broadcast_1", 1),
+]
+
+
+class FakeSession(BaseSession):
+    """Сессия Bot API без сети: запоминает методы и возвращает правдоподобный ответ"""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+        self._message_ids = itertools.count(100)
+
+    async def make_request(self, bot, method: TelegramMethod, timeout=None):
+        self.requests.append(method)
+        if method.__returning__ is bool:
+            return True
+        chat_id = getattr(method, "chat_id", TG_ID)
+        message = Message(message_id=next(self._message_ids), date=datetime.now(),
+                          chat=Chat(id=chat_id, type="private"), text="")
+        return message.as_(bot)
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+_update_ids = itertools.count(1)
+
+
+def make_update(text: str, callback: bool = False) -> Update:
+    user = TelegramUser(id=TG_ID, is_bot=False, first_name="Тест")
+    message = Message(message_id=1, date=datetime.now(),
+                      chat=Chat(id=TG_ID, type="private"), from_user=user, text=text)
+    if callback:
+        query = CallbackQuery(id=str(TG_ID), from_user=user, chat_instance="1",
+                              data=text, message=message)
+        return Update(update_id=next(_update_ids), callback_query=query)
+    return Update(update_id=next(_update_ids), message=message)
+
+
+@pytest.fixture(scope="module")
+def bot():
+    # Сессия БД подключается так же, как в main.setup_middlewares()
+    setup_db_session(main.dp, DataBaseSession(session_pool=session_maker),
+                     exclude=[main.user_group_router])
+    main.bot.session = FakeSession()
+    return main.bot
+
+
+async def feed(bot, text: str, callback: bool):
+    bot.session.requests.clear()
+    # Бюджет считается для холодных кэшей: порядок тестов на него не влияет
+    catalog_cache.invalidate()
+    broadcast_cache._items.clear()
+    with count_queries() as stats:
+        result = await main.dp.feed_update(bot, make_update(text, callback))
+    return result, stats
+
+
+def handler_errors(bot) -> list:
+    return [request.text for request in bot.session.requests
+            if isinstance(request, AnswerCallbackQuery) and request.show_alert]
+
+
+def test_handlers_fit_query_budgets(database, bot):
+    run(seed_broadcasts(50))
+
+    updates = [(text, budget, False) for text, budget in MESSAGE_BUDGETS]
+    updates += [(data, budget, True) for data, budget in CALLBACK_BUDGETS]
+    for text, budget, callback in updates:
+        result, stats = run(feed(bot, text, callback))
+
+        assert result is not UNHANDLED, text
+        assert not handler_errors(bot), text
+        assert stats.db_queries <= budget, (text, stats.db_queries, dict(stats.statements or {}))
+        assert not stats.repeated_statements(), text
+
+
+async def run_job(bot):
+    runner = JobRunner()
+    runner.start(bot, session_maker)
+
+    async def job(job, session):
+        await session.execute(select(func.count(User.id)))
+
+    with count_queries() as stats:
+        submitted = await runner.submit("Задача", job, chat_id=TG_ID)
+        await submitted.task
+    return stats
+
+
+def test_job_queries_do_not_count_toward_update(database, bot):
+    assert run(run_job(bot)).db_queries == 0
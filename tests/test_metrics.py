@@ -0,0 +1,43 @@
+from sqlalchemy import select
+
+from conftest import run
+from app import metrics
+from app.metrics import UpdateMetrics, count_queries, current_update
+from database.engine import session_maker
+from database.models import Course
+
+
+async def handle_updates(middleware: UpdateMetrics, count: int):
+    """Обработать count апдейтов с одним запросом к БД; вернуть счетчики каждого"""
+    seen = []
+
+    async def handler(event, data):
+        async with session_maker() as session:
+            await session.execute(select(Course.id).limit(1))
+        stats = current_update.get()
+        statements = sum(stats.statements.values()) if stats.statements is not None else None
+        seen.append((id(stats), stats.db_queries, statements))
+
+    # Регистрирует счетчик запросов на движке, как setup_metrics()
+    with count_queries():
+        pass
+    for _ in range(count):
+        await middleware(handler, None, {})
+    return seen
+
+
+def test_update_stats_are_reused_without_statement_text(database, monkeypatch):
+    monkeypatch.setattr(metrics, "SQL_BUDGET_STRICT", False)
+    seen = run(handle_updates(UpdateMetrics(), 3))
+
+    # Один объект счетчиков на все последовательные апдейты
+    assert len({stats_id for stats_id, _, _ in seen}) == 1
+    assert [queries for _, queries, _ in seen] == [1, 1, 1]
+    assert all(statements is None for _, _, statements in seen)
+
+
+def test_strict_mode_keeps_statement_text(database, monkeypatch):
+    monkeypatch.setattr(metrics, "SQL_BUDGET_STRICT", True)
+    seen = run(handle_updates(UpdateMetrics(), 2))
+
+    assert [statements for _, _, statements in seen] == [1, 1]
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select, text
+
+from conftest import run, seed_broadcasts
+from database.engine import engine, session_maker
+from database.models import Broadcast, BroadcastCourseAssociation, BroadcastDelivery, Course, User
+from database.orm_query import broadcasts_summary_query
+
+
+@pytest.fixture(scope="module", autouse=True)
+def broadcasts(database):
+    run(seed_broadcasts(300))
+
+
+def course_ids():
+    return select(BroadcastCourseAssociation.course_id).where(BroadcastCourseAssociation.broadcast_id == 1)
+
+
+def page_ids():
+    return (
+        select(Broadcast.id)
+        .order_by(Broadcast.created.desc(), Broadcast.id.desc())
+        .offset(10)
+        .limit(5)
+    )
+
+
+# Запросы горячих путей: получатели рассылки, рассылки курса пользователя,
+# статистика и отчеты по датам
+HOT_QUERIES = {
+    "recipients": lambda session: select(User.tg_id, User.course_id).where(User.course_id.in_(course_ids())),
+    "course_user_count": lambda session: select(func.count(User.id)).where(User.course_id == 1),
+    "user_broadcasts": lambda session: (
+        select(Broadcast.id)
+        .join(Broadcast.course_associations)
+        .where(Broadcast.project_id == 1,
+               Broadcast.is_sent == True,
+               Broadcast.is_active == True,
+               BroadcastCourseAssociation.course_id == 1)
+        .order_by(Broadcast.id.desc())
+    ),
+    "active_broadcasts_page": lambda session: (
+        select(Broadcast.id)
+        .where(Broadcast.is_active == True)
+        .order_by(Broadcast.created.desc())
+        .offset(5)
+        .limit(5)
+    ),
+    "broadcasts_by_date": lambda session: (
+        select(Broadcast.id)
+        .where(Broadcast.created.between(datetime(2025, 1, 2), datetime(2025, 1, 3)))
+    ),
+    "mailings_statistics_page": lambda session: (
+        broadcasts_summary_query(session, separator="\n", broadcast_ids=page_ids())
+        .order_by(Broadcast.created.desc(), Broadcast.id.desc())
+    ),
+    "pending_deliveries": lambda session: (
+        select(BroadcastDelivery.id)
+        .where(BroadcastDelivery.broadcast_id == 1,
+               BroadcastDelivery.status == BroadcastDelivery.STATUS_PENDING)
+        .order_by(BroadcastDelivery.id)
+        .limit(200)
+    ),
+    "courses_catalog": lambda session: select(Course.id, Course.name).order_by(Course.name, Course.id),
+}
+
+
+def full_scans(plan):
+    """Строки плана SQLite с полным просмотром таблицы (SCAN без индекса)"""
+    return [line for line in plan if line.startswith("SCAN ") and " INDEX " not in line]
+
+
+async def query_plan(build):
+    async with session_maker() as session:
+        query = build(session)
+        sql = str(query.compile(engine.sync_engine, compile_kwargs={"literal_binds": True}))
+        rows = await session.execute(text(f"EXPLAIN QUERY PLAN {sql}"))
+        return [row[-1] for row in rows]
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_query_uses_indexes(name):
+    plan = run(query_plan(HOT_QUERIES[name]))
+    assert not full_scans(plan), "\n".join(plan)
@@ -0,0 +1,40 @@
+from unittest.mock import AsyncMock
+
+from conftest import run, seed_broadcasts
+from app.handlers.admin_stats import mailings_report_job
+from app.metrics import count_queries
+from database.engine import session_maker
+
+
+class FakeJob:
+    """Фоновая задача без Telegram: файл отчета попадает в bot.send_document"""
+
+    def __init__(self):
+        self.chat_id = 1
+        self.bot = AsyncMock()
+
+    async def progress(self, text: str, force: bool = False):
+        pass
+
+
+async def report_queries():
+    job = FakeJob()
+    async with session_maker() as session:
+        with count_queries() as stats:
+            await mailings_report_job(job, session)
+    job.bot.send_document.assert_awaited_once()
+    # Файл собирается в потоке и приходит готовым xlsx (zip-архив)
+    document = job.bot.send_document.await_args.kwargs["document"]
+    assert document.data.startswith(b"PK")
+    return stats
+
+
+def test_mailings_report_query_count_does_not_grow(database):
+    run(seed_broadcasts(100))
+    small = run(report_queries())
+
+    run(seed_broadcasts(3000))
+    large = run(report_queries())
+
+    assert small.db_queries == large.db_queries == 1
+    assert not large.repeated_statements()
@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import DB_PATH
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Бюджет на импорт main, сек. Основное время - построение моделей aiogram.types
+STARTUP_IMPORT_BUDGET = float(os.getenv('STARTUP_IMPORT_BUDGET', 8))
+# Тяжелые библиотеки, которые загружаются только при первой выгрузке или миграции
+LAZY_MODULES = ("pandas", "xlsxwriter", "alembic", "mypyc", "sqlalchemy.testing")
+
+
+def import_times() -> dict:
+    """
+    Импортировать main в отдельном процессе с -X importtime.
+    :return: {модуль: накопленное время импорта в секундах}
+    """
+    env = dict(os.environ,
+               BOT_TOKEN="123456:TEST",
+               DB_URL=f"sqlite+aiosqlite:///{DB_PATH}")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative) / 1_000_000
+    return times
+
+
+def top_level_breakdown(times: dict, limit: int = 10) -> str:
+    """Самые медленные пакеты верхнего уровня"""
+    packages = {}
+    for name, seconds in times.items():
+        package = name.split(".")[0]
+        packages[package] = max(packages.get(package, 0), seconds)
+    packages.pop("main", None)
+    slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return "\n".join(f"  {name:<30} {seconds:.3f} с" for name, seconds in slowest)
+
+
+@pytest.fixture(scope="module")
+def startup_times():
+    return import_times()
+
+
+def test_startup_import_fits_budget(startup_times):
+    total = startup_times["main"]
+    breakdown = top_level_breakdown(startup_times)
+    print(f"\nИмпорт main: {total:.3f} с (бюджет {STARTUP_IMPORT_BUDGET} с)\n{breakdown}")
+
+    assert total <= STARTUP_IMPORT_BUDGET, (
+        f"Импорт main занял {total:.3f} с при бюджете {STARTUP_IMPORT_BUDGET} с:\n{breakdown}"
+    )
+
+
+def test_heavy_libraries_are_not_imported_at_startup(startup_times):
+    loaded = sorted(name for name in startup_times
+                    if any(name == lazy or name.startswith(f"{lazy}.") for lazy in LAZY_MODULES))
+    assert not loaded